@@ -0,0 +1,82 @@
+# Сравнение задержек get/set FSM-хранилищ: MemoryStorage против PostgresStorage
+# (горячий кэш, холодное чтение из БД, сброс пачки в БД и режим без кэша для нескольких экземпляров).
+# Запуск (нужна PostgreSQL, DSN берётся из DB_DSN, схема создаётся миграциями при подключении):
+#     python benchmarks/bench_fsm_storage.py [число операций]
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from dotenv import load_dotenv
+from db import Database
+from storage import PostgresStorage
+
+load_dotenv()
+
+BOT_ID = 1
+
+
+def make_key(i: int) -> StorageKey:
+    return StorageKey(bot_id=BOT_ID, chat_id=10_000_000 + i, user_id=10_000_000 + i)
+
+
+async def bench(storage, keys) -> tuple[float, float]:
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        await storage.set_state(key, "AddMember:input_user_id")
+        await storage.set_data(key, {"project_id": i, f"project_title_{i}": "bench"})
+    set_time = (time.perf_counter() - start) / (2 * len(keys))
+
+    start = time.perf_counter()
+    for key in keys:
+        await storage.get_state(key)
+        await storage.get_data(key)
+    get_time = (time.perf_counter() - start) / (2 * len(keys))
+    return set_time, get_time
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    dsn = os.getenv("DB_DSN")
+    if not dsn:
+        raise ValueError("Переменная DB_DSN не найдена в .env")
+    keys = [make_key(i) for i in range(n)]
+
+    memory_set, memory_get = await bench(MemoryStorage(), keys)
+
+    db = Database(dsn)
+    await db.connect()
+    storage = PostgresStorage(db)
+    pg_set, pg_get = await bench(storage, keys)
+
+    start = time.perf_counter()
+    await storage.flush()
+    flush_time = time.perf_counter() - start
+
+    # Холодное чтение: новый процессный кэш, всё читается из БД
+    cold = PostgresStorage(db)
+    start = time.perf_counter()
+    for key in keys:
+        await cold.get_data(key)
+    cold_get = (time.perf_counter() - start) / n
+
+    # Без кэша (FSM_CACHE=0): каждое чтение и запись - запрос к БД
+    uncached_set, uncached_get = await bench(PostgresStorage(db, cached=False), keys)
+
+    print(f"n={n}, мкс/операцию")
+    print(f"{'MemoryStorage':<32}set {memory_set * 1e6:>8.1f}   get {memory_get * 1e6:>8.1f}")
+    print(f"{'PostgresStorage (кэш)':<32}set {pg_set * 1e6:>8.1f}   get {pg_get * 1e6:>8.1f}")
+    print(f"{'PostgresStorage (из БД)':<32}{'':>16}get {cold_get * 1e6:>8.1f}")
+    print(f"{'PostgresStorage (без кэша)':<32}set {uncached_set * 1e6:>8.1f}   get {uncached_get * 1e6:>8.1f}")
+    print(f"Сброс {n} состояний в БД одной пачкой: {flush_time * 1000:.1f} мс")
+
+    await db.fetch_prepared("fsm_delete", [PostgresStorage._key(k) for k in keys])
+    await db.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
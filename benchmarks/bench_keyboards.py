@@ -0,0 +1,79 @@
+# Микро-бенчмарк клавиатур: сборка pydantic-моделей на каждый апдейт (прежнее поведение, функции _build_*)
+# против статических клавиатур и LRU-кэша keyboards.py (функции get_*).
+# Смесь апдейтов повторяет обработчики: главное меню, отмена, действия с проектом, подтверждения, настройки.
+# id проектов выбираются с перекосом (популярные проекты открывают чаще); отдельно показана сериализация
+# клавиатуры в JSON, которую aiogram выполняет при каждой отправке независимо от кэша.
+# Запуск (БД не нужна):
+#     python benchmarks/bench_keyboards.py [число апдейтов] [число проектов]
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import keyboards
+
+# (вес в смеси, прежняя сборка, кэшируемая версия, сколько id принимает)
+MIX = [
+    (30, keyboards._build_main_kb, keyboards.get_main_kb, 0),
+    (15, keyboards._build_cancel_kb, keyboards.get_cancel_kb, 0),
+    (20, keyboards._build_project_actions_kb, keyboards.get_project_actions_kb, 1),
+    (5, keyboards._build_confirm_deletion_kb, keyboards.get_confirm_deletion_kb, 1),
+    (5, keyboards._build_confirmadding_kb, keyboards.get_confirmadding_kb, 2),
+    (10, keyboards._build_confirm_kb, keyboards.get_confirm_kb, 0),
+    (10, keyboards._build_notifications_kb, keyboards.get_notifications_kb, 0),
+    (5, keyboards._build_reminder_kb, keyboards.get_reminder_kb, 0),
+]
+
+
+def make_calls(n: int, projects: int) -> list[tuple[int, tuple]]:
+    weights = [w for w, _, _, _ in MIX]
+    calls = []
+    for index in random.choices(range(len(MIX)), weights=weights, k=n):
+        # Распределение Парето: небольшая часть проектов получает большую часть обращений
+        args = tuple(min(int(random.paretovariate(1.2)), projects) for _ in range(MIX[index][3]))
+        calls.append((index, args))
+    return calls
+
+
+def bench(calls: list, column: int) -> float:
+    factories = [entry[column] for entry in MIX]
+    start = time.perf_counter()
+    for index, args in calls:
+        factories[index](*args)
+    return (time.perf_counter() - start) / len(calls)
+
+
+def bench_dump(calls: list) -> float:
+    factories = [entry[2] for entry in MIX]
+    markups = [factories[index](*args) for index, args in calls]
+    start = time.perf_counter()
+    for markup in markups:
+        markup.model_dump_json(exclude_none=True)
+    return (time.perf_counter() - start) / len(calls)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    projects = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    random.seed(1)
+    calls = make_calls(n, projects)
+
+    built = bench(calls, 1)
+    keyboards._keyboards.clear()
+    cold = bench(calls, 2)
+    warm = bench(calls, 2)
+    dumped = bench_dump(calls)
+    hits = keyboards._keyboards.hits / max(1, keyboards._keyboards.hits + keyboards._keyboards.misses)
+
+    print(f"апдейтов={n}, проектов={projects}, размер кэша={keyboards.KEYBOARD_CACHE_SIZE}")
+    print(f"{'сборка на каждый апдейт':<32}{built * 1e6:>10.2f} мкс/апдейт")
+    print(f"{'кэш, первый проход':<32}{cold * 1e6:>10.2f} мкс/апдейт")
+    print(f"{'кэш, повторный проход':<32}{warm * 1e6:>10.2f} мкс/апдейт (x{built / warm:.0f})")
+    print(f"{'сериализация при отправке':<32}{dumped * 1e6:>10.2f} мкс/апдейт")
+    print(f"доля попаданий в кэш: {hits:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Блокировка event loop логированием при всплеске апдейтов: прежняя схема (basicConfig с синхронным
+# FileHandler) против очереди (QueueHandler + поток-слушатель с RotatingFileHandler из logger.py).
+# Меряется время, которое вызовы логирования проводят в потоке event loop (пока оно идёт, другие
+# апдейты не обрабатываются), и задержка пробуждения задачи, которая спит по 1 мс.
+# Запуск (БД не нужна):
+#     python benchmarks/bench_logging.py [число апдейтов] [--fsync]
+# --fsync эмулирует медленный диск: после каждой записи делается fsync.
+import asyncio
+import contextlib
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import logger as log_setup
+
+LINES_PER_UPDATE = 4
+TICK = 0.001
+
+
+def add_fsync(handler: logging.FileHandler):
+    flush = handler.flush
+
+    def _flush():
+        flush()
+        if handler.stream:
+            os.fsync(handler.stream.fileno())
+
+    handler.flush = _flush
+
+
+def configure_sync(path: str, fsync: bool):
+    root = logging.getLogger()
+    root.handlers.clear()
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter(log_setup.LOG_FORMAT))
+    if fsync:
+        add_fsync(handler)
+    root.addHandler(handler)
+    root.addHandler(logging.StreamHandler(sys.stdout))
+    root.setLevel(logging.INFO)
+    return None
+
+
+def configure_queue(path: str, fsync: bool):
+    log_setup.LOG_FILE = path
+    listener = log_setup.setup_logging()
+    if fsync:
+        for handler in listener.handlers:
+            if isinstance(handler, logging.FileHandler):
+                add_fsync(handler)
+    return listener
+
+
+async def handle_update(log: logging.Logger, i: int, calls: list):
+    for n in range(LINES_PER_UPDATE):
+        start = time.perf_counter()
+        log.info("От пользователя с ID:%s обработана команда, шаг %d", 10_000_000 + i, n)
+        calls.append(time.perf_counter() - start)
+        # Имитация ожидания БД/Telegram между строками лога
+        await asyncio.sleep(TICK / 2)
+
+
+async def monitor(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def burst(n: int) -> tuple[float, list, list]:
+    log = logging.getLogger("bench")
+    lags, calls, stop = [], [], asyncio.Event()
+    watcher = asyncio.create_task(monitor(lags, stop))
+    await asyncio.sleep(TICK * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*(handle_update(log, i, calls) for i in range(n)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await watcher
+    return elapsed, lags, calls
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[max(int(len(values) * q) - 1, 0)] if values else 0.0
+
+
+def run(name: str, configure, n: int, fsync: bool, directory: str):
+    path = os.path.join(directory, f"{name}.log")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        listener = configure(path, fsync)
+        elapsed, lags, calls = asyncio.run(burst(n))
+        if listener:
+            listener.stop()
+    print(
+        f"{name:<8}{elapsed * 1000:>10.1f}{sum(calls) * 1000:>12.1f}{percentile(calls, 0.99) * 1e6:>12.1f}"
+        f"{max(calls) * 1e6:>12.1f}{statistics.mean(lags) * 1000:>12.2f}{percentile(lags, 0.99) * 1000:>12.2f}"
+    )
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n = int(args[0]) if args else 5000
+    fsync = "--fsync" in sys.argv
+    print(f"апдейтов={n}, строк лога={n * LINES_PER_UPDATE}, fsync={fsync}")
+    print(
+        f"{'':<8}{'всплеск,мс':>10}{'в логах,мс':>12}{'p99 выз,мкс':>12}"
+        f"{'макс,мкс':>12}{'лаг ср,мс':>12}{'лаг p99,мс':>12}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        run("sync", configure_sync, n, fsync, directory)
+        run("queue", configure_queue, n, fsync, directory)
+
+
+if __name__ == "__main__":
+    main()
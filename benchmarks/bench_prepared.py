@@ -0,0 +1,64 @@
+# Микро-бенчмарк горячих запросов: запросы реестра (fetch_prepared) против прежнего пути Database.fetch(query)
+# с тем же текстом запроса. Оба идут через один пул с кэшем запросов asyncpg по умолчанию, поэтому разница -
+# это накладные расходы самого реестра (поиск по имени, метрики), а не кэш asyncpg.
+# Запуск (нужна PostgreSQL, DSN берётся из DB_DSN, схема создаётся миграциями при подключении):
+#     python benchmarks/bench_prepared.py [число вызовов]
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dotenv import load_dotenv
+from db import Database
+from statements import STATEMENTS
+
+load_dotenv()
+
+HOT_QUERIES = {
+    "get_user_projects": (1,),
+    "user_exists": (1,),
+    "get_active_unikey": ("bench",),
+    "get_notification_settings": (1,),
+}
+
+
+async def bench_registry(db: Database, name: str, args: tuple, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        await db.fetch_prepared(name, *args)
+    return (time.perf_counter() - start) / n
+
+
+async def bench_query(db: Database, name: str, args: tuple, n: int) -> float:
+    query = STATEMENTS[name]
+    start = time.perf_counter()
+    for _ in range(n):
+        await db.fetch(query, *args)
+    return (time.perf_counter() - start) / n
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    dsn = os.getenv("DB_DSN")
+    if not dsn:
+        raise ValueError("Переменная DB_DSN не найдена в .env")
+
+    db = Database(dsn)
+    await db.connect()
+
+    print(f"{'запрос':<28}{'реестр':>12}{'db.fetch':>12}{'разница':>10}   (мкс/вызов, n={n})")
+    for name, args in HOT_QUERIES.items():
+        # Прогрев: запрос готовится на соединении при первом вызове
+        await bench_registry(db, name, args, 10)
+        await bench_query(db, name, args, 10)
+        registry = await bench_registry(db, name, args, n)
+        query = await bench_query(db, name, args, n)
+        print(f"{name:<28}{registry * 1e6:>12.1f}{query * 1e6:>12.1f}{(registry / query - 1) * 100:>9.1f}%")
+
+    await db.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
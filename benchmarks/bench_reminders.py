@@ -0,0 +1,265 @@
+# Бенчмарк движка напоминаний на синтетических данных: заполняет projects и notifications_settings
+# (распределение дедлайнов и часов напоминаний настраивается) и для каждого размера меряет
+#   - пересчёт reminder_schedule целиком (refresh_reminder_schedule) и план insert_reminder_schedule;
+#   - загрузку горизонта планировщиком (время, память кучи через tracemalloc);
+#   - захват наступивших напоминаний (claim_due_reminders): время и план (EXPLAIN ANALYZE, с откатом);
+#   - один цикл рассылки целиком: _fire_due + сброс отметок, отправка - заглушкой без сети.
+# Чтобы напоминания "наступили", данные сдвигаются на --window секунд назад (то же, что перевести часы вперёд).
+# Результаты дописываются строкой JSON в --out для сравнения между прогонами.
+# Запуск (на отдельной БД, DSN из DB_DSN, схема создаётся миграциями при подключении; расписание пересчитывается для всей БД):
+#     python benchmarks/bench_reminders.py --sizes 10000,100000,1000000 [--deadlines uniform|clustered|due]
+#         [--hours fixed|random] [--days 30] [--window 3600] [--out bench_reminders.jsonl]
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH-BENCH-BENCH-BENCH-BENCH-BENCH")
+
+from dotenv import load_dotenv
+from db import Database
+from scheduler import ReminderScheduler
+from statements import STATEMENTS
+
+load_dotenv()
+
+# Диапазон id синтетических пользователей
+USER_ID_BASE = 8_000_000_000
+PROJECTS_PER_USER = 5
+REMINDER_HOURS = [1, 2, 6, 12, 24]
+
+
+# Отправка без сети: сообщение сразу считается отправленным
+class StubSender:
+    def __init__(self):
+        self.sent = 0
+
+
+    def submit(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        self.sent += 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+def make_deadlines(n: int, kind: str, days: float, now: datetime) -> list[datetime]:
+    span = days * 86400
+    if kind == "clustered":
+        # 80% дедлайнов в одном узком окне (конец недели/семестра), остальные - равномерно
+        center = now + timedelta(days=min(days, 7))
+        return [
+            center + timedelta(seconds=random.gauss(0, 3600)) if random.random() < 0.8
+            else now + timedelta(seconds=random.uniform(60, span))
+            for _ in range(n)
+        ]
+    if kind == "due":
+        # Все дедлайны в ближайшие сутки: большая часть напоминаний наступает в одном цикле
+        return [now + timedelta(seconds=random.uniform(60, 86400)) for _ in range(n)]
+    return [now + timedelta(seconds=random.uniform(60, span)) for _ in range(n)]
+
+
+def make_hours(kind: str) -> list[int]:
+    if kind == "random":
+        return sorted(random.sample(REMINDER_HOURS, random.randint(1, len(REMINDER_HOURS))), reverse=True)
+    return [24, 6, 1]
+
+
+async def seed(db: Database, n: int, args, now: datetime):
+    users = max(1, n // PROJECTS_PER_USER)
+    deadlines = make_deadlines(n, args.deadlines, args.days, now)
+    async with db.acquire() as conn:
+        await conn.copy_records_to_table(
+            "notifications_settings",
+            records=[(USER_ID_BASE + u, True, make_hours(args.hours)) for u in range(users)],
+            columns=["user_id", "enable_reminders", "reminder_hours"]
+        )
+        await conn.copy_records_to_table(
+            "projects",
+            records=[(f"bench {i}", USER_ID_BASE + i % users, deadlines[i]) for i in range(n)],
+            columns=["title", "creator_id", "deadline"]
+        )
+        await conn.execute("ANALYZE projects; ANALYZE notifications_settings;")
+    return users
+
+
+async def cleanup(db: Database, users: int):
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "DELETE FROM reminder_schedule WHERE project_id IN "
+                "(SELECT id FROM projects WHERE creator_id >= $1 AND creator_id < $2);",
+                USER_ID_BASE, USER_ID_BASE + users
+            )
+            await conn.execute("DELETE FROM projects WHERE creator_id >= $1 AND creator_id < $2;", USER_ID_BASE, USER_ID_BASE + users)
+            await conn.execute(
+                "DELETE FROM notifications_settings WHERE user_id >= $1 AND user_id < $2;",
+                USER_ID_BASE, USER_ID_BASE + users
+            )
+
+
+# Сдвиг данных назад на window секунд: напоминания с fire_at в ближайшем окне становятся наступившими
+async def shift_back(db: Database, users: int, window: float):
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "UPDATE reminder_schedule SET fire_at = fire_at - $3::double precision * INTERVAL '1 second' WHERE project_id IN "
+                "(SELECT id FROM projects WHERE creator_id >= $1 AND creator_id < $2);",
+                USER_ID_BASE, USER_ID_BASE + users, window
+            )
+            await conn.execute(
+                "UPDATE projects SET deadline = deadline - $3::double precision * INTERVAL '1 second' "
+                "WHERE creator_id >= $1 AND creator_id < $2;",
+                USER_ID_BASE, USER_ID_BASE + users, window
+            )
+        await conn.execute("ANALYZE reminder_schedule;")
+
+
+# EXPLAIN (ANALYZE, BUFFERS) в транзакции с откатом: изменяющие запросы ничего не меняют
+async def explain(db: Database, name: str, *args) -> dict:
+    async with db.acquire() as conn:
+        tr = conn.transaction()
+        await tr.start()
+        try:
+            plan = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {STATEMENTS[name]}", *args)
+        finally:
+            await tr.rollback()
+    plan = json.loads(plan)[0] if isinstance(plan, str) else plan[0]
+    return {
+        "execution_ms": plan.get("Execution Time"),
+        "planning_ms": plan.get("Planning Time"),
+        "nodes": sorted(set(_node_types(plan["Plan"]))),
+        "plan": plan["Plan"]
+    }
+
+
+def _node_types(node: dict):
+    yield node["Node Type"] + (f" on {node['Relation Name']}" if "Relation Name" in node else "")
+    for child in node.get("Plans", []):
+        yield from _node_types(child)
+
+
+async def timed(coro) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+
+async def bench_size(db: Database, n: int, args) -> dict:
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    users = await seed(db, n, args, now)
+    seed_time = time.perf_counter() - start
+    try:
+        refresh_time, (_, rows) = await timed(db.refresh_reminder_schedule())
+        refresh_plan = await explain(db, "insert_reminder_schedule", None, None, datetime.utcnow())
+        await shift_back(db, users, args.window)
+
+        async with db.acquire() as conn:
+            table_bytes = await conn.fetchval("SELECT pg_total_relation_size('reminder_schedule');")
+            due_rows = await conn.fetchval(
+                "SELECT COUNT(*) FROM reminder_schedule WHERE fire_at <= $1;", datetime.utcnow()
+            )
+
+        sender = StubSender()
+        scheduler = ReminderScheduler(sender, db)
+        tracemalloc.start()
+        load_time, _ = await timed(scheduler.load())
+        heap_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        claim_now = datetime.utcnow()
+        claim_plan = await explain(db, "claim_due_reminders", claim_now, claim_now + timedelta(seconds=300), 3600.0)
+
+        start = time.perf_counter()
+        await scheduler._fire_due(force=True)
+        # Колбэки отправки выполняются на следующей итерации цикла, close() дожидается сброса отметок
+        await asyncio.sleep(0)
+        await scheduler.close()
+        cycle_time = time.perf_counter() - start
+
+        return {
+            "projects": n,
+            "users": users,
+            "seed_s": seed_time,
+            "schedule_rows": len(rows),
+            "schedule_table_bytes": table_bytes,
+            "refresh_s": refresh_time,
+            "refresh_plan": refresh_plan,
+            "load_s": load_time,
+            "heap_entries": len(scheduler._heap),
+            "heap_bytes": heap_bytes,
+            "due_rows": due_rows,
+            "claim_plan": claim_plan,
+            "cycle_s": cycle_time,
+            "cycle_sent": sender.sent
+        }
+    finally:
+        await cleanup(db, users)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def print_result(r: dict):
+    print(
+        f"{r['projects']:>9}{r['schedule_rows']:>10}{r['refresh_s'] * 1000:>11.0f}{r['load_s'] * 1000:>10.0f}"
+        f"{r['heap_bytes'] / 2**20:>9.1f}{r['due_rows']:>8}{r['claim_plan']['execution_ms']:>11.1f}"
+        f"{r['cycle_s'] * 1000:>10.0f}{r['cycle_sent']:>8}"
+    )
+    print(f"{'':>9}план захвата: {', '.join(r['claim_plan']['nodes'])}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк движка напоминаний")
+    parser.add_argument("--sizes", default="10000,100000", help="числа проектов через запятую")
+    parser.add_argument("--deadlines", choices=("uniform", "clustered", "due"), default="uniform")
+    parser.add_argument("--hours", choices=("fixed", "random"), default="fixed", help="24,6,1 или случайный набор")
+    parser.add_argument("--days", type=float, default=30, help="на сколько дней вперёд разбросаны дедлайны")
+    parser.add_argument("--window", type=float, default=3600, help="сколько секунд напоминаний наступает в цикле")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="bench_reminders.jsonl", help="файл результатов (JSON Lines)")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    dsn = os.getenv("DB_DSN")
+    if not dsn:
+        raise ValueError("Переменная DB_DSN не найдена в .env")
+    db = Database(dsn)
+    await db.connect()
+
+    print(
+        f"{'проектов':>9}{'строк':>10}{'пересч,мс':>11}{'загр,мс':>10}{'куча,МБ':>9}"
+        f"{'наступ':>8}{'захват,мс':>11}{'цикл,мс':>10}{'отпр':>8}"
+    )
+    meta = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "deadlines": args.deadlines,
+        "hours": args.hours,
+        "days": args.days,
+        "window_s": args.window
+    }
+    try:
+        for n in (int(x) for x in args.sizes.split(",")):
+            result = await bench_size(db, n, args)
+            print_result(result)
+            with open(args.out, "a", encoding="utf-8") as f:
+                f.write(json.dumps({**meta, **result}, ensure_ascii=False, default=str) + "\n")
+    finally:
+        await db.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+# Микро-бенчмарк отрисовки волны напоминаний: прежний цикл (f-строка и datetime.utcnow() на каждое сообщение,
+# без часовых поясов и языков), str.format с выбором шаблона и пояса на каждое сообщение и render_reminders
+# из templates.py (один now на пачку, пояс и шаблон выбираются один раз на пару (timezone, language_code)).
+# Запуск (БД не нужна):
+#     python benchmarks/bench_templates.py [число напоминаний]
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from templates import _SOURCES, hours_left, render_reminders, templates_for, to_local, user_zone
+
+ZONES = [None, "Europe/Moscow", "Asia/Yekaterinburg", "Europe/Berlin", "America/New_York"]
+LANGUAGES = [None, "ru", "en", "en-US", "de"]
+
+
+def make_projects(n: int, now: datetime) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "title": f"Проект {i}",
+            "deadline": now + timedelta(seconds=random.uniform(3600, 86400)),
+            "timezone": random.choice(ZONES),
+            "language_code": random.choice(LANGUAGES)
+        }
+        for i in range(n)
+    ]
+
+
+def render_old(projects) -> list[str]:
+    texts = []
+    for p in projects:
+        hours = (p["deadline"] - datetime.utcnow()).total_seconds() // 3600
+        texts.append(f"⚠️ Проект «{p['title']}»: дедлайн через {int(hours)} ч.")
+    return texts
+
+
+def render_format(projects, now: datetime) -> list[str]:
+    texts = []
+    for p in projects:
+        language = (p["language_code"] or "ru")[:2]
+        source = _SOURCES.get(language, _SOURCES["ru"])["reminder"]
+        texts.append(source.format(
+            title=p["title"],
+            hours=hours_left(p["deadline"], now),
+            deadline=to_local(p["deadline"], user_zone(p["timezone"]))
+        ))
+    return texts
+
+
+# Лучшее время из нескольких прогонов
+def timed(fn, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    random.seed(1)
+    now = datetime.utcnow()
+    projects = make_projects(n, now)
+    # Прогрев: кэш ZoneInfo и шаблонов
+    render_reminders(projects[:100], now)
+    templates_for(None)
+
+    results = {
+        "прежний цикл (без поясов)": timed(render_old, projects),
+        "str.format на сообщение": timed(render_format, projects, now),
+        "render_reminders": timed(render_reminders, projects, now)
+    }
+    print(f"напоминаний={n}")
+    for name, elapsed in results.items():
+        print(f"{name:<28}{elapsed * 1000:>9.1f} мс{elapsed / n * 1e6:>9.2f} мкс/сообщение")
+
+
+if __name__ == "__main__":
+    main()
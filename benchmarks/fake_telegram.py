@@ -0,0 +1,123 @@
+# Фейковый Telegram Bot API для нагрузочных тестов: отвечает на методы, которые использует бот,
+# и складывает отправленные сообщения во "входящие" чатов, чтобы симулятор мог читать ответы бота.
+# Работает в отдельном потоке со своим event loop, чтобы не конкурировать с ботом за его loop.
+# Можно запустить отдельно (тогда TELEGRAM_API_URL бота указывает на него):
+#     python benchmarks/fake_telegram.py [порт] [задержка ответа, мс]
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LoadTestBot", "username": "load_test_bot"}
+
+
+class FakeTelegram:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        # chat_id -> список отправленных ботом сообщений (dict в формате Bot API)
+        self.inbox = defaultdict(list)
+        self.calls = Counter()
+        self._message_id = 0
+        self._loop = None
+        self._thread = None
+        self._runner = None
+        self._started = threading.Event()
+
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+
+    def _next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+
+    def _message(self, chat_id: int, text: str | None, reply_markup: str | None) -> dict:
+        message = {
+            "message_id": self._next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text or ""
+        }
+        if reply_markup:
+            message["reply_markup"] = json.loads(reply_markup)
+        return message
+
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+        if not params and request.can_read_body:
+            params = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            reply_markup = params.get("reply_markup")
+            if isinstance(reply_markup, dict):
+                reply_markup = json.dumps(reply_markup)
+            message = self._message(chat_id, params.get("text"), reply_markup)
+            if method == "editMessageText":
+                message["message_id"] = int(params.get("message_id", 0))
+            self.inbox[chat_id].append(message)
+            # В ответе Bot API у сообщения бывает только инлайн-клавиатура, обычная остаётся во "входящих"
+            result = dict(message)
+            if "inline_keyboard" not in result.get("reply_markup", {}):
+                result.pop("reply_markup", None)
+        else:
+            # deleteMessage, answerCallbackQuery, setWebhook, deleteWebhook и прочее
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+    async def _serve(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._serve())
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+
+    def start_in_thread(self):
+        self._thread = threading.Thread(target=self._run, name="fake-telegram", daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    server = FakeTelegram(port=port, latency=latency)
+    server.start_in_thread()
+    print(f"Фейковый Bot API: {server.url} (задержка {latency * 1000:.0f} мс), Ctrl+C - выход")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,280 @@
+# Нагрузочный тест: настоящий router бота (handlers_commands/handlers_actions) и PostgreSQL,
+# фейковый Bot API (fake_telegram.py) и тысячи симулированных пользователей.
+# Пара пользователей проходит сценарий: /start -> создать проект -> "Мои проекты" -> открыть проект ->
+# установить дедлайн -> пригласить второго -> второй принимает приглашение.
+# Апдейты подаются прямо в dp.feed_update (без polling), время шага - от подачи апдейта до конца обработки,
+# включая ответы бота через фейковый API. По каждому шагу: число, ошибки, p50/p95/p99 и запросы к БД.
+# Запуск (нужна PostgreSQL, DSN берётся из DB_DSN, схема создаётся миграциями при подключении; тестовые пользователи удаляются в конце):
+#     python benchmarks/loadtest.py [--pairs 1000] [--concurrency 200] [--api-latency-ms 0] [--json results.json]
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_telegram import FakeTelegram
+
+FAKE_PORT = int(os.getenv("LOADTEST_API_PORT", "8081"))
+os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{FAKE_PORT}"
+os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST-LOADTEST-LOADTEST-LOADTEST")
+# Лимиты Telegram в тесте не нужны: меряем сам бот, а не ожидание в очереди отправки
+os.environ.setdefault("SENDER_GLOBAL_RATE", "1000000")
+os.environ.setdefault("SENDER_CHAT_RATE", "1000000")
+os.environ.setdefault("SENDER_CHAT_BURST", "1000000")
+
+from aiogram.types import Update
+
+import tracing
+from callbacks import ACCEPT_INVITE, ADD_MEMBER, PROJECT_OPEN, SET_DEADLINE, decode
+
+# Диапазон id тестовых пользователей (не пересекается с настоящими id Telegram)
+USER_ID_BASE = 9_000_000_000
+
+STEPS = ("start", "create_project", "list", "open", "set_deadline", "invite", "accept")
+
+
+class Simulator:
+    def __init__(self, dp, bot, api: FakeTelegram):
+        self.dp = dp
+        self.bot = bot
+        self.api = api
+        self._update_id = itertools.count(1)
+        self._message_id = itertools.count(1)
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(int)
+        self.errors = defaultdict(int)
+
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"Load{user_id}", "username": f"load{user_id}"}
+
+
+    def _message(self, user_id: int, text: str) -> dict:
+        return {
+            "message_id": next(self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text
+        }
+
+
+    def message_update(self, user_id: int, text: str) -> Update:
+        data = {"update_id": next(self._update_id), "message": self._message(user_id, text)}
+        return Update.model_validate(data, context={"bot": self.bot})
+
+
+    def callback_update(self, user_id: int, data: str) -> Update:
+        message = self._message(user_id, "")
+        message["from"] = {"id": 1, "is_bot": True, "first_name": "LoadTestBot"}
+        payload = {
+            "update_id": next(self._update_id),
+            "callback_query": {
+                "id": str(next(self._message_id)),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "message": message,
+                "data": data
+            }
+        }
+        return Update.model_validate(payload, context={"bot": self.bot})
+
+
+# Один шаг сценария: апдейты подаются по очереди, время и число запросов к БД - на весь шаг
+    async def step(self, name: str, user_id: int, *updates: Update):
+        inbox = self.api.inbox[user_id]
+        seen = len(inbox)
+        start = time.perf_counter()
+        with tracing.start() as trace:
+            try:
+                for update in updates:
+                    await self.dp.feed_update(self.bot, update)
+            except Exception:
+                self.errors[name] += 1
+        self.latencies[name].append(time.perf_counter() - start)
+        self.queries[name] += sum(1 for kind, _, _ in trace.spans if kind == "db")
+        # Обработчики ловят исключения сами и отвечают пользователю сообщением об ошибке
+        if any("Произошла ошибка" in m["text"] or m["text"].startswith("Ошибка") for m in inbox[seen:]):
+            self.errors[name] += 1
+
+
+    def last_callback(self, user_id: int, action) -> str | None:
+        for message in reversed(self.api.inbox[user_id]):
+            for row in message.get("reply_markup", {}).get("inline_keyboard", []):
+                for button in row:
+                    decoded = decode(button.get("callback_data"))
+                    if decoded and decoded[0] is action:
+                        return button["callback_data"]
+        return None
+
+
+    async def scenario(self, pair: int):
+        owner = USER_ID_BASE + 2 * pair
+        guest = owner + 1
+        await self.step("start", owner, self.message_update(owner, "/start"))
+        await self.step("start", guest, self.message_update(guest, "/start"))
+        await self.step(
+            "create_project", owner,
+            self.message_update(owner, "Создать проект"),
+            self.message_update(owner, f"Нагрузочный проект {pair}")
+        )
+        await self.step("list", owner, self.message_update(owner, "Мои проекты"))
+        callback = self.last_callback(owner, PROJECT_OPEN)
+        if callback is None:
+            self.errors["list"] += 1
+            return
+        project_id = PROJECT_OPEN.unpack(callback)["project_id"]
+        await self.step("open", owner, self.callback_update(owner, callback))
+        await self.step(
+            "set_deadline", owner,
+            self.callback_update(owner, SET_DEADLINE.pack(project_id)),
+            self.message_update(owner, "25.12.2030 18:30")
+        )
+        await self.step(
+            "invite", owner,
+            self.callback_update(owner, ADD_MEMBER.pack(project_id)),
+            self.message_update(owner, str(guest))
+        )
+        await self.step(
+            "accept", guest,
+            self.callback_update(guest, ACCEPT_INVITE.pack(owner, project_id)),
+            self.message_update(guest, "Готово")
+        )
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+def report(sim: Simulator, api: FakeTelegram, elapsed: float, args) -> dict:
+    steps = {}
+    for name in STEPS:
+        values = sim.latencies.get(name, [])
+        steps[name] = {
+            "count": len(values),
+            "errors": sim.errors.get(name, 0),
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "db_queries_per_step": sim.queries.get(name, 0) / len(values) if values else 0.0
+        }
+    total = sum(s["count"] for s in steps.values())
+    return {
+        "pairs": args.pairs,
+        "concurrency": args.concurrency,
+        "api_latency_ms": args.api_latency_ms,
+        "elapsed_s": elapsed,
+        "steps_per_s": total / elapsed if elapsed else 0.0,
+        "api_calls": dict(api.calls),
+        "steps": steps
+    }
+
+
+def print_report(result: dict):
+    print(
+        f"пар пользователей={result['pairs']}, параллельно={result['concurrency']}, "
+        f"задержка API={result['api_latency_ms']} мс"
+    )
+    print(f"время: {result['elapsed_s']:.1f} с, пропускная способность: {result['steps_per_s']:.0f} шагов/с")
+    print(f"{'шаг':<16}{'число':>8}{'ошибки':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'запросов БД':>13}")
+    for name, s in result["steps"].items():
+        print(
+            f"{name:<16}{s['count']:>8}{s['errors']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+            f"{s['p99_ms']:>10.1f}{s['db_queries_per_step']:>13.1f}"
+        )
+    print("вызовы Bot API:", ", ".join(f"{k}={v}" for k, v in sorted(result["api_calls"].items())))
+
+
+# Удаление всего, что создал прогон: проекты с участниками и расписанием, приглашения, настройки,
+# состояния FSM и самих синтетических пользователей
+async def cleanup(db, pairs: int):
+    from unikey_cipher import unikey_cipher
+
+    last = USER_ID_BASE + 2 * pairs
+    # Ключ приглашения - шифр (проект, владелец, приглашённый), приглашённый в паре - владелец + 1
+    projects = await db.fetch(
+        "SELECT id, creator_id FROM projects WHERE creator_id >= $1 AND creator_id < $2;", USER_ID_BASE, last
+    )
+    keys = [await unikey_cipher(p["id"], p["creator_id"], p["creator_id"] + 1) for p in projects]
+    await db.execute("DELETE FROM invites WHERE key = ANY($1::varchar[]);", keys)
+    # Ключ FSM - "bot_id:chat_id:user_id:...", синтетические пользователи - по user_id
+    await db.execute(
+        """
+        DELETE FROM fsm_storage
+        WHERE CASE
+            WHEN split_part(key, ':', 3) ~ '^[0-9]+$'
+                THEN split_part(key, ':', 3)::bigint >= $1 AND split_part(key, ':', 3)::bigint < $2
+            ELSE FALSE
+        END;
+        """,
+        USER_ID_BASE, last
+    )
+    for table in ("project_members", "reminder_schedule"):
+        await db.execute(
+            f"DELETE FROM {table} WHERE project_id IN "
+            "(SELECT id FROM projects WHERE creator_id >= $1 AND creator_id < $2);",
+            USER_ID_BASE, last
+        )
+    await db.execute("DELETE FROM projects WHERE creator_id >= $1 AND creator_id < $2;", USER_ID_BASE, last)
+    await db.execute("DELETE FROM notifications_settings WHERE user_id >= $1 AND user_id < $2;", USER_ID_BASE, last)
+    await db.execute("DELETE FROM users WHERE user_id >= $1 AND user_id < $2;", USER_ID_BASE, last)
+
+
+async def run(args):
+    from main import DB_DSN, build_dispatcher
+    from bot import bot
+    from db import Database
+    from sender import sender
+
+    api = FakeTelegram(port=FAKE_PORT, latency=args.api_latency_ms / 1000)
+    api.start_in_thread()
+
+    db = Database(DB_DSN)
+    await db.connect()
+    await db.warm_known_users()
+    dp = build_dispatcher(db)
+    sender.start()
+
+    sim = Simulator(dp, bot, api)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(pair: int):
+        async with semaphore:
+            await sim.scenario(pair)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(limited(pair) for pair in range(args.pairs)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await dp.storage.close()
+        await sender.stop()
+        await cleanup(db, args.pairs)
+        await bot.session.close()
+        await db.pool.close()
+        api.stop()
+
+    result = report(sim, api, elapsed, args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с фейковым Bot API")
+    parser.add_argument("--pairs", type=int, default=1000, help="пар пользователей (владелец + приглашённый)")
+    parser.add_argument("--concurrency", type=int, default=200, help="сколько пар работает одновременно")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="задержка ответа фейкового Bot API")
+    parser.add_argument("--json", help="куда сохранить результаты в JSON")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from metrics import Counter
+
+CACHE_HITS = Counter("cache_hits_total", "Попадания в кэш", ("cache",))
+CACHE_MISSES = Counter("cache_misses_total", "Промахи кэша", ("cache",))
+
+_MISSING = object()
+
+
+# In-process LRU-кэш с TTL. ttl=None - записи не устаревают, вытесняются только по размеру.
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float | None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+
+# Значение по ключу (default, если нет или устарело)
+    def get(self, key, default=None):
+        item = self._data.get(key, _MISSING)
+        if item is not _MISSING:
+            value, expires_at = item
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                CACHE_HITS.inc(cache=self.name)
+                return value
+            del self._data[key]
+        self.misses += 1
+        CACHE_MISSES.inc(cache=self.name)
+        return default
+
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+
+    def clear(self):
+        self._data.clear()
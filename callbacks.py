@@ -0,0 +1,160 @@
+from typing import Awaitable, Callable
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery
+
+# Лимит Telegram на callback_data (байт)
+CALLBACK_DATA_LIMIT = 64
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+# Разделитель полей; в старом формате ("delete_project_5") второй символ всегда буква
+_SEPARATOR = "."
+
+
+# Целое число в base36 (короче десятичного: id пользователя Telegram - 7 символов вместо 10)
+def _pack_int(value: int) -> str:
+    if value < 0:
+        return "-" + _pack_int(-value)
+    digits = []
+    while True:
+        value, rem = divmod(value, 36)
+        digits.append(_DIGITS[rem])
+        if not value:
+            return "".join(reversed(digits))
+
+
+# Действие кнопки: однобуквенный префикс и целочисленные поля.
+# callback_data = префикс + поля в base36 через точку, например "o.2s" - открыть проект 100.
+class CallbackAction:
+    __slots__ = ("prefix", "name", "fields")
+
+    def __init__(self, prefix: str, name: str, fields: tuple[str, ...] = ()):
+        if len(prefix) != 1 or not prefix.isascii() or prefix == _SEPARATOR:
+            raise ValueError(f"Префикс действия {name} должен быть одним ASCII-символом: {prefix!r}")
+        self.prefix = prefix
+        self.name = name
+        self.fields = fields
+
+
+    def __repr__(self) -> str:
+        return f"CallbackAction({self.prefix!r}, {self.name!r}, {self.fields!r})"
+
+
+    def pack(self, *values: int) -> str:
+        if len(values) != len(self.fields):
+            raise ValueError(f"{self.name}: ожидается {len(self.fields)} полей, передано {len(values)}")
+        data = _SEPARATOR.join((self.prefix, *(_pack_int(int(v)) for v in values)))
+        if len(data) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"{self.name}: callback_data длиннее {CALLBACK_DATA_LIMIT} байт: {data}")
+        return data
+
+
+    def unpack(self, data: str) -> dict[str, int]:
+        parts = data.split(_SEPARATOR)
+        if parts[0] != self.prefix or len(parts) != len(self.fields) + 1:
+            raise ValueError(f"{self.name}: неверная callback_data {data!r}")
+        return {field: int(part, 36) for field, part in zip(self.fields, parts[1:])}
+
+
+# Действия бота (префиксы не должны повторяться, порядок полей - как в pack)
+PROJECT_OPEN = CallbackAction("o", "project_open", ("project_id",))
+PROJECTS_PAGE = CallbackAction("p", "projects_page", ("forward", "project_id"))
+DELETE_PROJECT = CallbackAction("d", "delete_project", ("project_id",))
+CONFIRM_DELETE = CallbackAction("D", "confirm_delete", ("project_id",))
+CANCEL_DELETION = CallbackAction("x", "cancel_deletion")
+ADD_MEMBER = CallbackAction("m", "add_member", ("project_id",))
+SET_DEADLINE = CallbackAction("t", "set_deadline", ("project_id",))
+ACCEPT_INVITE = CallbackAction("a", "accept_invite", ("user_id", "project_id"))
+DENY_INVITE = CallbackAction("r", "deny_invite", ("user_id", "project_id"))
+REMINDER_TOGGLE = CallbackAction("h", "reminder_toggle", ("hour",))
+REMINDER_SAVE = CallbackAction("s", "reminder_save")
+EDIT_REMINDERS = CallbackAction("e", "edit_reminders")
+BACK_TO_MAIN = CallbackAction("b", "back_to_main")
+
+ACTIONS = {
+    action.prefix: action
+    for action in (
+        PROJECT_OPEN, PROJECTS_PAGE, DELETE_PROJECT, CONFIRM_DELETE, CANCEL_DELETION, ADD_MEMBER, SET_DEADLINE,
+        ACCEPT_INVITE, DENY_INVITE, REMINDER_TOGGLE, REMINDER_SAVE, EDIT_REMINDERS, BACK_TO_MAIN
+    )
+}
+
+# Старый формат ("accept_addto_<user_id>_<project_id>") остаётся в кнопках уже отправленных сообщений:
+# имя без чисел -> (действие, значения первых полей, которых не было в старой callback_data)
+LEGACY_ACTIONS = {
+    "project_open": (PROJECT_OPEN, ()),
+    "projects_next": (PROJECTS_PAGE, (1,)),
+    "projects_prev": (PROJECTS_PAGE, (0,)),
+    "delete_project": (DELETE_PROJECT, ()),
+    "confirm_delete": (CONFIRM_DELETE, ()),
+    "cancel_deletion": (CANCEL_DELETION, ()),
+    "add_member": (ADD_MEMBER, ()),
+    "set_deadline": (SET_DEADLINE, ()),
+    "accept_addto": (ACCEPT_INVITE, ()),
+    "deny_addto": (DENY_INVITE, ()),
+    "reminder_toggle": (REMINDER_TOGGLE, ()),
+    "reminder_save": (REMINDER_SAVE, ()),
+    "edit_reminders": (EDIT_REMINDERS, ()),
+    "back_to_main": (BACK_TO_MAIN, ())
+}
+
+
+# Действие и поля по callback_data (None, если данные не наши)
+def decode(data: str | None) -> tuple[CallbackAction, dict[str, int]] | None:
+    if not data:
+        return None
+    try:
+        if len(data) == 1 or data[1] == _SEPARATOR:
+            action = ACTIONS.get(data[0])
+            return (action, action.unpack(data)) if action else None
+        name = data.rstrip("0123456789_")
+        legacy = LEGACY_ACTIONS.get(name)
+        if legacy is None:
+            return None
+        action, leading = legacy
+        values = (*leading, *(int(part) for part in data[len(name):].split("_") if part))
+        if len(values) != len(action.fields):
+            return None
+        return action, dict(zip(action.fields, values))
+    except ValueError:
+        return None
+
+
+CallbackHandler = Callable[..., Awaitable]
+
+
+# Маршрутизация callback-запросов по префиксу: в aiogram регистрируется один обработчик, который
+# находит обработчик действия в словаре, вместо перебора фильтров F.data.startswith(...) по порядку
+class CallbackDispatcher:
+    def __init__(self):
+        self._handlers: dict[str, CallbackHandler] = {}
+
+
+# Декоратор: handler(callback, state, **поля действия)
+    def handler(self, action: CallbackAction):
+        def register(handler: CallbackHandler) -> CallbackHandler:
+            if action.prefix in self._handlers:
+                raise ValueError(f"Обработчик для {action.name} уже зарегистрирован")
+            self._handlers[action.prefix] = handler
+            return handler
+        return register
+
+
+# Фильтр aiogram: найденный обработчик и поля попадают в data (и в HandlerMetricsMiddleware)
+    def filter(self, callback: CallbackQuery) -> dict | bool:
+        decoded = decode(callback.data)
+        if decoded is None:
+            return False
+        action, fields = decoded
+        handler = self._handlers.get(action.prefix)
+        if handler is None:
+            return False
+        return {"callback_handler": handler, "callback_fields": fields}
+
+
+    async def dispatch(self, callback: CallbackQuery, state: FSMContext, callback_handler: CallbackHandler, callback_fields: dict):
+        return await callback_handler(callback, state, **callback_fields)
+
+
+# Подключить к роутеру aiogram (до остальных обработчиков callback_query)
+    def attach(self, router):
+        router.callback_query.register(self.dispatch, self.filter)
@@ -1,190 +1,469 @@
+import asyncio
 import asyncpg
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
+from dotenv import load_dotenv
 import logging
+import os
+import time
+from cache import TTLCache
+from metrics import Counter, Gauge, Histogram
+from migrate import migrate
+from statements import STATEMENTS
+import tracing
 
 
 logger = logging.getLogger(__name__)
 
+load_dotenv()
+
+
+def _env_float(name: str, default: float | None) -> float | None:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# Настройки пула соединений (по умолчанию - как в asyncpg, кроме таймаута ожидания соединения)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_ACQUIRE_TIMEOUT = _env_float("DB_ACQUIRE_TIMEOUT", 10.0)
+DB_COMMAND_TIMEOUT = _env_float("DB_COMMAND_TIMEOUT", None)
+DB_MAX_INACTIVE_LIFETIME = _env_float("DB_MAX_INACTIVE_LIFETIME", 300.0)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Применять миграции схемы при подключении
+DB_MIGRATE = os.getenv("DB_MIGRATE", "1") == "1"
+
+# Кэш настроек уведомлений
+SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", "10000"))
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "600"))
+# Кэш зарегистрированных пользователей: user_id -> language_code (только положительные ответы, вытеснение по LRU)
+KNOWN_USERS_CACHE_SIZE = int(os.getenv("KNOWN_USERS_CACHE_SIZE", "100000"))
+_UNKNOWN_USER = object()
+
+POOL_SIZE = Gauge("db_pool_size", "Текущее число соединений в пуле")
+POOL_IDLE = Gauge("db_pool_idle", "Число свободных соединений в пуле")
+POOL_MAX_SIZE = Gauge("db_pool_max_size", "Максимальный размер пула")
+POOL_ACQUIRE_WAIT = Histogram("db_pool_acquire_wait_seconds", "Время ожидания соединения из пула")
+POOL_ACQUIRE_TIMEOUTS = Counter("db_pool_acquire_timeouts_total", "Число таймаутов ожидания соединения из пула")
+QUERY_DURATION = Histogram("db_query_duration_seconds", "Время выполнения запроса к PostgreSQL", ("query",))
+QUERY_ERRORS = Counter("db_query_errors_total", "Ошибки запросов к PostgreSQL", ("query",))
+
+
+# Метка запроса для метрик: имя подготовленного запроса или начало текста SQL
+def _query_label(query: str) -> str:
+    return " ".join(query.split())[:80]
+
+
+# Замер времени запроса (без ожидания соединения из пула)
+@contextmanager
+def _timed(label: str):
+    start = time.perf_counter()
+    try:
+        with tracing.span("db", label):
+            yield
+    except Exception:
+        QUERY_ERRORS.inc(query=label)
+        raise
+    finally:
+        QUERY_DURATION.observe(time.perf_counter() - start, query=label)
+
+
+# Запрос реестра, привязанный к соединению пула, с замером времени (в том числе внутри транзакций).
+# Объекты PreparedStatement asyncpg нельзя использовать после возврата соединения в пул,
+# поэтому запрос выполняется через кэш запросов соединения: он готовится на сервере
+# при первом вызове на этом соединении и дальше переиспользуется.
+class TimedStatement:
+    __slots__ = ("name", "query", "connection")
+
+    def __init__(self, name: str, query: str, connection: asyncpg.Connection):
+        self.name = name
+        self.query = query
+        self.connection = connection
+
+
+    async def fetch(self, *args):
+        with _timed(self.name):
+            return await self.connection.fetch(self.query, *args)
+
+
+    async def fetchrow(self, *args):
+        with _timed(self.name):
+            return await self.connection.fetchrow(self.query, *args)
+
+
+    async def fetchval(self, *args):
+        with _timed(self.name):
+            return await self.connection.fetchval(self.query, *args)
+
+
+# Соединение с реестром подготовленных запросов (заполняется в init пула)
+class PreparedConnection(asyncpg.Connection):
+    prepared: dict
+
+
+# Канал LISTEN/NOTIFY, по которому процессы сообщают планировщику об изменённых проектах
+REMINDER_SCHEDULE_CHANNEL = "reminder_schedule"
+
+
+# id проектов через запятую, порциями в пределах лимита payload NOTIFY (8000 байт)
+def _notify_payloads(project_ids) -> list[str]:
+    payloads, current = [], []
+    size = 0
+    for project_id in sorted(project_ids):
+        item = str(project_id)
+        if current and size + len(item) + 1 > 7900:
+            payloads.append(",".join(current))
+            current, size = [], 0
+        current.append(item)
+        size += len(item) + 1
+    if current:
+        payloads.append(",".join(current))
+    return payloads
+
 
 # Инит
 class Database:
     def __init__(self, dsn: str):
         self.dsn = dsn
         self.pool = None
+        self.scheduler = None
+        # Кэшировать ли настройки и часовой пояс пользователей в памяти процесса: кэш не сверяется с БД,
+        # поэтому выключается, когда апдейты одного чата могут попасть в разные процессы (см. main.build_dispatcher)
+        self.cached = True
+        self.settings_cache = TTLCache("notification_settings", SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL)
+        self.known_users = TTLCache("known_users", KNOWN_USERS_CACHE_SIZE, None)
+        self.locale_cache = TTLCache("user_locale", SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL)
 
 
 # Подключение к базе данных
     async def connect(self):
         try:
-            self.pool = await asyncpg.create_pool(self.dsn)
-            logger.info(f"Подключение к PostgreSQL успешно")
+            if DB_MIGRATE:
+                await migrate(self.dsn)
+            self.pool = await asyncpg.create_pool(
+                self.dsn,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                command_timeout=DB_COMMAND_TIMEOUT,
+                max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+                # Кэш должен вмещать весь реестр, иначе запросы реестра будут вытеснять друг друга
+                statement_cache_size=max(DB_STATEMENT_CACHE_SIZE, len(STATEMENTS)) if DB_STATEMENT_CACHE_SIZE else 0,
+                connection_class=PreparedConnection,
+                init=self._prepare_statements
+            )
+            POOL_SIZE.set_function(self.pool.get_size)
+            POOL_IDLE.set_function(self.pool.get_idle_size)
+            POOL_MAX_SIZE.set(DB_POOL_MAX_SIZE)
+            logger.info("Подключение к PostgreSQL успешно")
+
+        except Exception as e:
+            logger.error("Ошибка подключения к PostgreSQL: %s", e)
+            raise
+
+
+# Взять соединение из пула с таймаутом и замером времени ожидания
+    @asynccontextmanager
+    async def acquire(self):
+        start = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+        except asyncio.TimeoutError:
+            POOL_ACQUIRE_TIMEOUTS.inc()
+            logger.error("Таймаут ожидания соединения из пула (%s сек)", DB_ACQUIRE_TIMEOUT)
+            raise
+        POOL_ACQUIRE_WAIT.observe(time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+
+
+# Реестр запросов на новом соединении пула
+    @staticmethod
+    async def _prepare_statements(conn: PreparedConnection):
+        conn.prepared = {name: TimedStatement(name, query, conn) for name, query in STATEMENTS.items()}
+
+
+# Выполнить подготовленный запрос из реестра и вернуть все строки
+    async def fetch_prepared(self, name: str, *args):
+        try:
+            async with self.acquire() as conn:
+                return await conn.prepared[name].fetch(*args)
+
+        except Exception as e:
+            logger.error("Ошибка выполнения подготовленного запроса %s: %s", name, e)
+            raise
+
+
+# Выполнить подготовленный запрос из реестра и вернуть первую строку
+    async def fetchrow_prepared(self, name: str, *args):
+        try:
+            async with self.acquire() as conn:
+                return await conn.prepared[name].fetchrow(*args)
 
         except Exception as e:
-            logger.error(f"Ошибка подключения к PostgreSQL: {e}")
+            logger.error("Ошибка выполнения подготовленного запроса %s: %s", name, e)
+            raise
+
+
+# Выполнить подготовленный запрос из реестра и вернуть одно значение
+    async def fetchval_prepared(self, name: str, *args):
+        try:
+            async with self.acquire() as conn:
+                return await conn.prepared[name].fetchval(*args)
+
+        except Exception as e:
+            logger.error("Ошибка выполнения подготовленного запроса %s: %s", name, e)
             raise
 
 
 # Выполнить запрос
     async def execute(self, query: str, *args):
         try:
-            async with self.pool.acquire() as conn:
-                return await conn.execute(query, *args)
-            logger.info(f"Был выполнен запрос к PostgreSQL(execute): {query}")
+            logger.debug("Был выполнен запрос к PostgreSQL(execute): %s", query)
+            async with self.acquire() as conn:
+                with _timed(_query_label(query)):
+                    return await conn.execute(query, *args)
 
         except Exception as e:
-            logger.error(f"Ошибка выполнения запроса к PostgreSQL(execute): {e}")
+            logger.error("Ошибка выполнения запроса к PostgreSQL(execute): %s", e)
             raise
 
 
 # Извлечь данные из запроса
     async def fetch(self, query: str, *args):
         try:
-            logger.info(f"Был выполнен запрос к PostgreSQL(fetch): {query}")
-            async with self.pool.acquire() as conn:
-                return await conn.fetch(query, *args)
+            logger.debug("Был выполнен запрос к PostgreSQL(fetch): %s", query)
+            async with self.acquire() as conn:
+                with _timed(_query_label(query)):
+                    return await conn.fetch(query, *args)
+
+        except Exception as e:
+            logger.error("Ошибка выполнения запроса к PostgreSQL(fetch): %s", e)
+            raise
+
+
+# Проверка на существование пользователя (известные пользователи - без запроса к БД)
+    async def user_exists(self, user_id) -> bool:
+        if user_id in self.known_users:
+            return True
+        result = await self.fetchval_prepared("user_exists", user_id)
+        if result is not None:
+            self.known_users.set(user_id, True)
+            return True
+        return False
+
+
+# Регистрация пользователя (/start). known_users хранит язык пользователя (True - пользователь есть,
+# язык неизвестен): повторные /start пишут в БД, только если язык Telegram изменился или ещё не записан
+    async def register_user(
+        self,
+        user_id: int,
+        username: str | None,
+        full_name: str | None,
+        language_code: str | None = None
+    ):
+        known = self.known_users.get(user_id, _UNKNOWN_USER)
+        if known is not _UNKNOWN_USER and (language_code is None or known == language_code):
+            return
+        try:
+            await self.fetch_prepared("register_user", user_id, username, full_name, language_code)
+            self.known_users.set(user_id, language_code)
+            self.locale_cache.invalidate(user_id)
+            logger.info("Пользователь с ID:%s зарегистрирован", user_id)
 
         except Exception as e:
-            logger.error(f"Ошибка выполнения запроса к PostgreSQL(fetch): {e}")
+            logger.error("Ошибка регистрации пользователя с ID:%s: %s", user_id, e)
             raise
 
 
-# Проверка на существование пользователя
-    async def user_exists(self, user_id):
-        query = """
-        SELECT * FROM users
-        WHERE user_id = $1;
-        """
-        result = await self.fetch(query, user_id)
-        return result
+# Часовой пояс и язык пользователя: (timezone, language_code), None - не выбраны
+    async def get_user_locale(self, user_id: int) -> tuple[str | None, str | None]:
+        try:
+            cached = self.locale_cache.get(user_id) if self.cached else None
+            if cached is None:
+                row = await self.fetchrow_prepared("get_user_locale", user_id)
+                cached = (row["timezone"], row["language_code"]) if row else (None, None)
+                if self.cached:
+                    self.locale_cache.set(user_id, cached)
+            return cached
+        except Exception as e:
+            logger.error("Ошибка получения часового пояса пользователя с ID:%s: %s", user_id, e)
+            return None, None
+
+
+# Сохранение часового пояса пользователя (False - пользователь не зарегистрирован)
+    async def set_user_timezone(self, user_id: int, timezone: str) -> bool:
+        try:
+            updated = await self.fetchval_prepared("set_user_timezone", user_id, timezone)
+            self.locale_cache.invalidate(user_id)
+            logger.info("Пользователь с ID:%s выбрал часовой пояс %s", user_id, timezone)
+            return updated is not None
+
+        except Exception as e:
+            logger.error("Ошибка сохранения часового пояса пользователя с ID:%s: %s", user_id, e)
+            raise
+
+
+# Прогрев кэша известных пользователей последними зарегистрированными
+    async def warm_known_users(self):
+        try:
+            rows = await self.fetch_prepared("get_recent_users", KNOWN_USERS_CACHE_SIZE)
+            for row in reversed(rows):
+                self.known_users.set(row["user_id"], row["language_code"])
+            logger.info("Кэш пользователей прогрет: %d", len(rows))
+
+        except Exception as e:
+            logger.error("Ошибка прогрева кэша пользователей: %s", e)
 
 
 # Создание проекта в PostgreSQL
     async def create_project(self, title: str, creator_id: int) -> int:
-        query = """
-        INSERT INTO projects (title, creator_id, created_at)
-        VALUES ($1, $2, NOW())
-        RETURNING id;
-        """
-        try:
-            project_id = await self.pool.fetchval(query, title, creator_id)
-            logger.info(f"Проект с ID:{project_id} создан пользователем с ID:{creator_id}")
+        try:
+            project_id = await self.fetchval_prepared("create_project", title, creator_id)
+            logger.info("Проект с ID:%s создан пользователем с ID:%s", project_id, creator_id)
+            await self._reschedule(project_ids=[project_id])
             return project_id
 
         except Exception as e:
-            logger.error(f"Ошибка создания проекта: {e}")
+            logger.error("Ошибка создания проекта: %s", e)
             raise
 
 
 # Получение списка проектов
     async def get_user_projects(self, user_id: int):
-        query = """
-        SELECT * FROM projects
-        WHERE creator_id = $1;
-        """
         try:
-            projects = await self.fetch(query, user_id)
-            logger.info(f"Получен список проектов для пользователя с ID:{user_id}")
+            projects = await self.fetch_prepared("get_user_projects", user_id)
+            logger.debug("Получен список проектов для пользователя с ID:%s", user_id)
             return projects
 
         except Exception as e:
-            logger.error(f"Ошибка получения списка проектов: {e}")
+            logger.error("Ошибка получения списка проектов: %s", e)
             raise
 
 
-# Удаление проекта
+# Страница проектов пользователя (keyset-пагинация по id).
+# after_id - следующая страница после проекта, before_id - предыдущая перед проектом.
+# Возвращает (проекты, есть_предыдущая, есть_следующая).
+    async def get_user_projects_page(
+        self,
+        user_id: int,
+        after_id: int = 0,
+        before_id: int | None = None,
+        limit: int = 10
+    ) -> tuple[list, bool, bool]:
+        try:
+            if before_id is not None:
+                rows = await self.fetch_prepared("get_user_projects_before", user_id, before_id, limit + 1)
+                projects = list(reversed(rows[:limit]))
+                has_prev, has_next = len(rows) > limit, True
+            else:
+                rows = await self.fetch_prepared("get_user_projects_after", user_id, after_id, limit + 1)
+                projects = rows[:limit]
+                has_prev, has_next = after_id > 0, len(rows) > limit
+            logger.debug("Получена страница проектов для пользователя с ID:%s", user_id)
+            return projects, has_prev, has_next
+
+        except Exception as e:
+            logger.error("Ошибка получения страницы проектов: %s", e)
+            raise
+
+
+# Получение проекта пользователя (создателя или участника)
+    async def get_user_project(self, project_id: int, user_id: int):
+        try:
+            return await self.fetchrow_prepared("get_user_project", project_id, user_id)
+
+        except Exception as e:
+            logger.error("Ошибка получения проекта с ID:%s: %s", project_id, e)
+            raise
+
+
+# Удаление проекта (проверка прав и удаление одним запросом)
     async def delete_project(self, project_id: int, user_id: int) -> bool:
         try:
-            row = await self.fetch(
-                "SELECT 1 FROM projects WHERE id = $1 AND creator_id = $2;",
-                project_id, user_id
-            )
-            if not row:
-                logger.error(f"Ошибка удаления проекта: проекта не существует/у удаляющего пользователя нет прав")
+            async with self.acquire() as conn:
+                async with conn.transaction():
+                    deleted = await conn.prepared["delete_project"].fetchval(project_id, user_id)
+            if deleted is None:
+                logger.error("Ошибка удаления проекта: проекта не существует/у удаляющего пользователя нет прав")
                 return False
 
-            await self.execute(
-                "DELETE FROM project_members WHERE project_id = $1;",
-                project_id
-            )
-            await self.execute(
-                "DELETE FROM projects WHERE id = $1;",
-                project_id
-            )
-            logger.info(f"Проект с ID:{project_id} пользователя с ID:{user_id} удалён!")
+            logger.info("Проект с ID:%s пользователя с ID:%s удалён!", project_id, user_id)
+            if self.scheduler:
+                self.scheduler.remove_project(project_id)
             return True
 
         except Exception as e:
-            logger.error(f"Ошибка удаления проекта: {e}")
+            logger.error("Ошибка удаления проекта: %s", e)
             raise
 
 
-# Добавление участника в проект
+# Добавление участника в проект (проверка прав, существования пользователя и вставка одним запросом)
     async def add_member(self, project_id: int, user_id: int, creator_id: int) -> bool:
         try:
-            row = await self.fetch(
-                "SELECT 1 FROM projects WHERE id = $1 AND creator_id = $2;",
-                project_id, creator_id
-            )
-            if not row:
-                logger.error(f"Ошибка добавления участника в проект: проекта не существует/у добавляющего пользователя нет прав")
+            async with self.acquire() as conn:
+                async with conn.transaction():
+                    row = await conn.prepared["add_member"].fetchrow(project_id, user_id, creator_id)
+            if not row["project_ok"]:
+                logger.error("Ошибка добавления участника в проект: проекта не существует/у добавляющего пользователя нет прав")
                 return False
 
-            if not await self.user_exists(user_id):
-                logger.error(f"Ошибка добавления участника в проект: пользователя не существует")
+            if not row["user_ok"]:
+                logger.error("Ошибка добавления участника в проект: пользователя не существует")
                 return False
 
-            await self.execute(
-                "INSERT INTO project_members (project_id, user_id) VALUES ($1, $2) ON CONFLICT DO NOTHING;",
-                project_id, user_id
-            )
-            logger.info(f"В проект с ID:{project_id} пользователем с ID:{creator_id} добавлен пользователь с ID:{user_id}")
+            logger.info("В проект с ID:%s пользователем с ID:%s добавлен пользователь с ID:%s", project_id, creator_id, user_id)
+            # Участник получает напоминания по своим настройкам
+            await self._reschedule(project_ids=[project_id], user_id=user_id)
             return True
 
         except Exception as e:
-            logger.error(f"Ошибка добавления пользователя в проект: {e}")
+            logger.error("Ошибка добавления пользователя в проект: %s", e)
             raise
 
 
-# Установка дедлайна
+# Установка дедлайна (проверка прав и обновление одним запросом, расписание - в той же транзакции)
     async def set_deadline(self, project_id: int, deadline: datetime, creator_id: int) -> bool:
         try:
-            row = await self.fetch(
-                "SELECT 1 FROM projects WHERE id = $1 AND creator_id = $2;",
-                project_id, creator_id
-            )
-            if not row:
-                logger.error(f"Ошибка установки дедлайна: проекта не существует/у добавляющего пользователя нет прав")
-                return False
-
-            await self.execute(
-                "UPDATE projects SET deadline = $1 WHERE id = $2;",
-                deadline, project_id
-            )
-            logger.info(f"В проекте с ID:{project_id} пользователем с ID:{creator_id} установлен дедлайн {datetime}")
+            async with self.acquire() as conn:
+                async with conn.transaction():
+                    updated = await conn.prepared["set_deadline"].fetchval(deadline, project_id, creator_id)
+                    if updated is None:
+                        logger.error("Ошибка установки дедлайна: проекта не существует/у добавляющего пользователя нет прав")
+                        return False
+                    affected, rows = await self.refresh_reminder_schedule(project_ids=[project_id], conn=conn)
+
+            logger.info("В проекте с ID:%s пользователем с ID:%s установлен дедлайн %s", project_id, creator_id, deadline)
+            if self.scheduler:
+                self.scheduler.update_projects(affected, rows)
             return True
 
         except Exception as e:
-            logger.error(f"Ошибка установки дедлайна: {e}")
+            logger.error("Ошибка установки дедлайна: %s", e)
             raise
 
 
 # Получение настроек уведомлений
     async def get_notification_settings(self, user_id: int) -> dict | None:
         try:
-            result = await self.fetch(
-                "SELECT enable_reminders, reminder_hours FROM notifications_settings WHERE user_id = $1;",
-                user_id
-            )
-            if result:
-                row = result[0]
+            cached = self.settings_cache.get(user_id, False) if self.cached else False
+            if cached is False:
+                row = await self.fetchrow_prepared("get_notification_settings", user_id)
+                cached = self._settings_from_row(row)
+                if self.cached:
+                    self.settings_cache.set(user_id, cached)
+            if cached:
+                # Копия: обработчики меняют список интервалов на месте
                 return {
-                    "enable_reminders": row["enable_reminders"],
-                    "reminder_hours": row["reminder_hours"]
+                    "enable_reminders": cached["enable_reminders"],
+                    "reminder_hours": list(cached["reminder_hours"]),
+                    "digest": cached["digest"]
                 }
-            logger.debug(f"У пользователя с ID:{user_id} нет настроек")
+            logger.debug("У пользователя с ID:%s нет настроек", user_id)
             return None
         except Exception as e:
-            logger.error(f"Ошибка получения настроек для пользователя с ID:{user_id}: {e}")
+            logger.error("Ошибка получения настроек для пользователя с ID:%s: %s", user_id, e)
             return None
 
 
@@ -193,7 +472,8 @@ class Database:
         self,
         user_id: int,
         enable_reminders: bool | None = None,
-        reminder_hours: list[int] | None = None
+        reminder_hours: list[int] | None = None,
+        digest: bool | None = None
     ):
         try:
             if reminder_hours is not None:
@@ -201,129 +481,229 @@ class Database:
                     raise ValueError("Список интервалов не может быть пустым")
                 if not all(isinstance(h, int) and h > 0 for h in reminder_hours):
                     raise ValueError("Все интервалы должны быть положительными целыми числами")
-            query = """
-                INSERT INTO notifications_settings (user_id, enable_reminders, reminder_hours)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (user_id) DO UPDATE
-                SET
-                    enable_reminders = CASE
-                        WHEN $2 IS NULL THEN notifications_settings.enable_reminders
-                        ELSE $2
-                    END,
-                    reminder_hours = CASE
-                        WHEN $3 IS NULL THEN notifications_settings.reminder_hours
-                        ELSE $3
-                    END;
-            """
-            await self.execute(query, user_id, enable_reminders, reminder_hours)
-            logger.info(f"Настройки сохранены для пользователя с ID:{user_id}")
+            row = await self.fetchrow_prepared(
+                "update_notification_settings", user_id, enable_reminders, reminder_hours, digest
+            )
+            self.settings_cache.set(user_id, self._settings_from_row(row))
+            logger.info("Настройки сохранены для пользователя с ID:%s", user_id)
+            # Режим сводки не влияет на расписание
+            if enable_reminders is not None or reminder_hours is not None:
+                await self._reschedule(user_id=user_id)
 
         except Exception as e:
-            logger.error(f"Ошибка сохранения настроек для пользователя с ID:{user_id}")
+            self.settings_cache.invalidate(user_id)
+            logger.error("Ошибка сохранения настроек для пользователя с ID:%s", user_id)
             raise
 
 
-# Получение проектов с приближающимся дедлайном
-    async def get_projects_near_deadline(self) -> list[dict]:
-        query = """
-        SELECT DISTINCT
-            p.id,
-            p.title,
-            p.deadline,
-            p.creator_id,
-            ns.reminder_hours
-        FROM projects p
-        JOIN notifications_settings ns ON p.creator_id = ns.user_id
-        JOIN UNNEST(ns.reminder_hours) AS rh ON TRUE
-        WHERE
-            p.deadline BETWEEN NOW() AND NOW() + INTERVAL '24 hours'
-            AND ns.enable_reminders = TRUE
-            AND (
-                p.last_notification_sent IS NULL
-                OR p.last_notification_sent <
-                p.deadline - (rh * INTERVAL '1 hour')
-            )
-            AND p.deadline - (rh * INTERVAL '1 hour') >= NOW()
-            ORDER BY p.deadline;
-            """
+# Переключить интервал напоминаний (добавить/убрать час) одним запросом, без чтения-изменения-записи:
+# параллельные переключения из разных процессов не затирают друг друга. Последний интервал не убирается.
+    async def toggle_reminder_hour(self, user_id: int, hour: int) -> dict:
         try:
-            projects = await self.fetch(query)
-            logger.info("Найдено проектов для уведомлений: %d", len(projects))
-            return projects
+            row = await self.fetchrow_prepared("toggle_reminder_hour", user_id, hour)
+            settings = self._settings_from_row(row)
+            self.settings_cache.set(user_id, settings)
+            logger.info("Настройки сохранены для пользователя с ID:%s", user_id)
+            await self._reschedule(user_id=user_id)
+            return settings
 
         except Exception as e:
-            logger.error(f"Ошибка выборки проектов: {e}")
-            return []
+            self.settings_cache.invalidate(user_id)
+            logger.error("Ошибка переключения интервала для пользователя с ID:%s: %s", user_id, e)
+            raise
 
 
-# Обновить таймер уведомлений
-    async def set_last_notification(self, project_id: int, ts: datetime):
+# Переключить режим сводки одним запросом; возвращает новое значение
+    async def toggle_digest(self, user_id: int) -> bool:
         try:
-            await self.execute("UPDATE projects SET last_notification_sent = $1 WHERE id = $2;", ts, project_id)
-            logger.info(f"Таймер уведомлений обновлён для проекта с ID:{project_id}")
+            row = await self.fetchrow_prepared("toggle_digest", user_id)
+            self.settings_cache.set(user_id, self._settings_from_row(row))
+            logger.info("Настройки сохранены для пользователя с ID:%s", user_id)
+            return row["digest"]
 
         except Exception as e:
-            logger.error(f"Ошибка обновления таймера уведомлений для проекта с ID:{project_id}: {e}")
+            self.settings_cache.invalidate(user_id)
+            logger.error("Ошибка переключения сводки для пользователя с ID:%s: %s", user_id, e)
+            raise
+
+
+    @staticmethod
+    def _settings_from_row(row) -> dict | None:
+        if not row:
+            return None
+        return {
+            "enable_reminders": row["enable_reminders"],
+            "reminder_hours": tuple(row["reminder_hours"] or ()),
+            "digest": row["digest"]
+        }
+
+
+# Пересчёт материализованного расписания напоминаний (reminder_schedule) для проектов/получателя.
+# Строки строятся на каждого получателя (создатель и участники) по его собственным настройкам.
+# Возвращает id затронутых проектов и новые строки расписания.
+    async def refresh_reminder_schedule(
+        self,
+        project_ids: list[int] | None = None,
+        user_id: int | None = None,
+        conn: asyncpg.Connection | None = None
+    ) -> tuple[set[int], list]:
+        try:
+            if conn is None:
+                async with self.acquire() as conn:
+                    async with conn.transaction():
+                        affected, rows = await self._refresh_reminder_schedule(conn, project_ids, user_id)
+            else:
+                affected, rows = await self._refresh_reminder_schedule(conn, project_ids, user_id)
+            logger.info("Расписание напоминаний пересчитано, строк: %d", len(rows))
+            return affected, rows
+
+        except Exception as e:
+            logger.error("Ошибка пересчёта расписания напоминаний: %s", e)
+            raise
+
+
+    async def _refresh_reminder_schedule(self, conn, project_ids, user_id) -> tuple[set[int], list]:
+        deleted = await conn.prepared["delete_reminder_schedule"].fetch(project_ids, user_id)
+        rows = await conn.prepared["insert_reminder_schedule"].fetch(project_ids, user_id, datetime.utcnow())
+        affected = {r["project_id"] for r in deleted} | {r["project_id"] for r in rows}
+        if project_ids:
+            affected.update(project_ids)
+        # Планировщик может работать в другом процессе - сообщаем ему об изменениях (доставка после COMMIT)
+        for payload in _notify_payloads(affected):
+            await conn.prepared["notify_reminder_schedule"].fetch(payload)
+        return affected, rows
+
+
+# Получение расписания напоминаний конкретных проектов (по уведомлению из другого процесса)
+    async def get_project_reminders(self, project_ids: list[int]) -> list:
+        try:
+            return await self.fetch_prepared("get_project_reminders", project_ids)
+
+        except Exception as e:
+            logger.error("Ошибка получения напоминаний проектов: %s", e)
+            raise
+
+
+# Пересчитать расписание и сообщить планировщику (ошибка не должна ломать основное действие)
+    async def _reschedule(self, project_ids: list[int] | None = None, user_id: int | None = None):
+        try:
+            affected, rows = await self.refresh_reminder_schedule(project_ids, user_id)
+            if self.scheduler:
+                # Пересчитаны строки одного получателя, а планировщик заменяет напоминания проекта целиком -
+                # ему нужны строки всех получателей затронутых проектов
+                if user_id is not None and affected:
+                    rows = await self.get_project_reminders(list(affected))
+                self.scheduler.update_projects(affected, rows)
+
+        except Exception as e:
+            logger.error("Ошибка обновления расписания напоминаний: %s", e)
+
+
+# Получение ожидающих напоминаний из расписания (для загрузки планировщика)
+    async def get_reminder_schedule(self, since: datetime, until: datetime | None = None) -> list:
+        try:
+            rows = await self.fetch_prepared("get_reminder_schedule", since, until)
+            logger.info("Загружено напоминаний в расписание: %d", len(rows))
+            return rows
+
+        except Exception as e:
+            logger.error("Ошибка загрузки расписания напоминаний: %s", e)
+            raise
+
+
+# Захват наступивших напоминаний (range scan по индексу fire_at, строка на проект и получателя).
+# Строки блокируются FOR UPDATE SKIP LOCKED и помечаются claimed_until, поэтому несколько экземпляров
+# не получат одно напоминание; неотправленное снова станет доступно после claimed_until.
+# Получателю в режиме сводки, у которого что-то наступило, заодно захватываются его напоминания
+# на digest_window сек вперёд - они уходят той же сводкой, а не отдельными сообщениями позже.
+# Возвращает число захваченных строк, сами они читаются iter_claimed_reminders.
+    async def claim_due_reminders(self, now: datetime, claimed_until: datetime, digest_window: float = 0) -> int:
+        try:
+            await self.fetch_prepared("purge_expired_reminders", now)
+            claimed = await self.fetchval_prepared("claim_due_reminders", now, claimed_until, digest_window)
+            logger.info("Найдено напоминаний для отправки: %d", claimed)
+            return claimed
+
+        except Exception as e:
+            logger.error("Ошибка выборки проектов: %s", e)
+            raise
+
+
+# Захваченные напоминания (claimed_until - метка захвата): строка на получателя и проект, с часовым
+# поясом, языком и режимом сводки получателя. Строки упорядочены по получателю и отдаются порциями
+# через серверный курсор, чтобы большая волна не загружалась в память целиком.
+    async def iter_claimed_reminders(self, claimed_until: datetime, now: datetime, batch_size: int):
+        async with self.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(STATEMENTS["get_claimed_reminders"], claimed_until, now)
+                while True:
+                    with _timed("get_claimed_reminders"):
+                        rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+
+
+# Обновить таймер уведомлений (и убрать отправленное напоминание получателя из расписания)
+    async def set_last_notification(self, project_id: int, user_id: int, ts: datetime, fire_at: datetime):
+        await self.set_last_notifications_many([(project_id, user_id, ts, fire_at)])
+
+
+# Пакетно обновить таймеры уведомлений: один запрос на всю пачку отправленных напоминаний.
+# Элемент - (project_id, user_id, время отправки, fire_at последнего отправленного напоминания).
+    async def set_last_notifications_many(self, items: list[tuple[int, int, datetime, datetime]]):
+        if not items:
+            return
+        project_ids, user_ids, sent_at, fire_at = (list(column) for column in zip(*items))
+        try:
+            await self.fetch_prepared("set_last_notifications", project_ids, user_ids, sent_at, fire_at)
+            logger.info("Таймеры уведомлений обновлены, отправок: %d", len(items))
+
+        except Exception as e:
+            logger.error("Ошибка обновления таймеров уведомлений для проектов %s: %s", sorted(set(project_ids)), e)
+            raise
 
 
 # Установить unikey
     async def set_unikey(self, unikey: str, active: bool, answer: bool):
-        query = """
-        INSERT INTO invites (key, active, answer)
-        VALUES ($1, $2, $3)
-        ON CONFLICT (key) DO UPDATE
-        SET active = $2, answer = $3
-        """
         try:
-            await self.execute(query, unikey, active, answer)
-            logger.info(f"Задан unikey: {unikey}")
+            await self.fetch_prepared("set_unikey", unikey, active, answer)
+            logger.info("Задан unikey: %s", unikey)
 
         except Exception as e:
-            logger.error(f"Ошибка установки уникального кода приглашения: {e}")
+            logger.error("Ошибка установки уникального кода приглашения: %s", e)
 
 
 # Проверить unikey на активность
     async def unikey_isactive(self, unikey: str) -> bool:
-        query = """
-        SELECT * FROM invites
-        WHERE key = $1
-        AND active = True;
-        """
-        try:
-            result = await self.fetch(query, unikey)
-            if not result:
-                logger.info(f"unikey {unikey} не найден или неактивен")
+        try:
+            record = await self.fetchrow_prepared("get_active_unikey", unikey)
+            if not record:
+                logger.info("unikey %s не найден или неактивен", unikey)
                 return False
-            record = result[0]
             is_active = record['active']
             is_valid = is_active
-            logger.info(f"unikey {unikey} проверен, результат: {is_valid}")
+            logger.info("unikey %s проверен, результат: %s", unikey, is_valid)
             return is_valid
 
         except Exception as e:
-            logger.error(f"Ошибка проверки уникального кода приглашения: {e}")
+            logger.error("Ошибка проверки уникального кода приглашения: %s", e)
             return False
 
 
 
     async def check_unikey(self, unikey: str) -> bool:
-        query = """
-        SELECT * FROM invites
-        WHERE key = $1
-        AND active = True;
-        """
-        try:
-            result = await self.fetch(query, unikey)
-            if not result:
-                logger.info(f"unikey {unikey} не найден или неактивен")
+        try:
+            record = await self.fetchrow_prepared("get_active_unikey", unikey)
+            if not record:
+                logger.info("unikey %s не найден или неактивен", unikey)
                 return False
-            record = result[0]
             is_active = record['active']
             has_answer = record['answer']
             is_valid = is_active and has_answer
-            logger.info(f"unikey {unikey} проверен, результат: {is_valid}")
+            logger.info("unikey %s проверен, результат: %s", unikey, is_valid)
             return is_valid
 
         except Exception as e:
-            logger.error(f"Ошибка проверки уникального кода приглашения: {e}")
+            logger.error("Ошибка проверки уникального кода приглашения: %s", e)
             return False
@@ -1,7 +1,12 @@
+import asyncio
 from db import Database
 from unikey_cipher import unikey_cipher
 from keyboards import get_main_kb, get_confirm_kb, get_confirmadding_kb, get_project_actions_kb
-from bot import bot
+from callbacks import (
+    CallbackDispatcher, ACCEPT_INVITE, ADD_MEMBER, CANCEL_DELETION, CONFIRM_DELETE, DENY_INVITE
+)
+from sender import sender
+from templates import to_utc, user_zone
 import os
 from dotenv import load_dotenv
 from aiogram import Router, types, F
@@ -18,6 +23,9 @@ load_dotenv()
 DB_DSN = os.getenv("DB_DSN")
 router = Router()
 router.db = Database(DB_DSN)
+# Обработчики кнопок (callback_query) - через таблицу префиксов, см. callbacks.py
+callbacks = CallbackDispatcher()
+callbacks.attach(router)
 
 # Состояния FSM
 class CreateProject(StatesGroup):
@@ -34,6 +42,12 @@ class SetDeadline(StatesGroup):
     input_date = State()
 
 
+# Часовой пояс пользователя: в нём вводятся и показываются дедлайны
+async def get_user_zone(user_id: int):
+    timezone, _ = await router.db.get_user_locale(user_id)
+    return user_zone(timezone)
+
+
 
 # Обработка названия проекта(по состоянию FSM)
 @router.message(CreateProject.enter_title)
@@ -62,22 +76,22 @@ async def create_project_finish(message: types.Message, state: FSMContext):
         await message.answer(f"Проект \"{title}\" создан! ✅", reply_markup=get_main_kb())
         await state.clear()
 
-        logger.info(f"От пользователя с ID:{message.chat.id} обработана команда \"Закончить создание проекта\"")
+        logger.info('От пользователя с ID:%s обработана команда "Закончить создание проекта"', message.chat.id)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике ввода названия проекта: {e}")
+        logger.error("Ошибка в обработчике ввода названия проекта: %s", e)
         await message.answer("Произошла ошибка. Попробуйте позже.")
         await state.clear()
 
 
 # Обработка подтверждения удаления проекта (по состоянию FSM)
-@router.callback_query(F.data.startswith("confirm_delete_"))
-async def confirm_delete_project(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.handler(CONFIRM_DELETE)
+async def confirm_delete_project(callback: types.CallbackQuery, state: FSMContext, project_id: int):
     try:
         data = await state.get_data()
-        project_id = data.get("project_id")
 
-        if not project_id:
+        # Кнопка должна относиться к проекту, удаление которого сейчас подтверждается
+        if not project_id or data.get("project_id") != project_id:
             await callback.answer("Ошибка: проект не найден.")
             return
 
@@ -91,13 +105,13 @@ async def confirm_delete_project(callback: types.CallbackQuery, state: FSMContex
             if msg_id:
                 try:
                     await callback.bot.delete_message(chat_id=chat_id, message_id=msg_id)
-                    logger.info(f"Сообщение о проекте {project_id} удалено (message_id={msg_id})")
+                    logger.info("Сообщение о проекте %s удалено (message_id=%s)", project_id, msg_id)
                 except Exception as e:
-                    logger.error(f"Не удалось удалить сообщение {msg_id}: {e}")
+                    logger.error("Не удалось удалить сообщение %s: %s", msg_id, e)
             try:
                 await callback.bot.delete_message(chat_id=chat_id, message_id=callback.message.message_id)
             except Exception as e:
-                logger.error(f"Не удалось удалить подтверждение: {e}")
+                logger.error("Не удалось удалить подтверждение: %s", e)
 
 
             await callback.answer("Проект удалён ✅")
@@ -109,24 +123,24 @@ async def confirm_delete_project(callback: types.CallbackQuery, state: FSMContex
         })
         await state.clear()  # Или state.reset_state()
 
-        logger.info(f"Проект {project_id} удалён пользователем {callback.from_user.id}")
+        logger.info("Проект %s удалён пользователем %s", project_id, callback.from_user.id)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике подтверждения удаления проекта: {e}")
+        logger.error("Ошибка в обработчике подтверждения удаления проекта: %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте позже.")
         await state.clear()
 
 
 # Обработка отмены удаления проекта
-@router.callback_query(F.data == "cancel_deletion")
+@callbacks.handler(CANCEL_DELETION)
 async def cancel_deletion(callback: types.CallbackQuery, state: FSMContext):
     try:
         await callback.message.answer("Удаление отменено.")
         await state.clear()
-        logger.info(f"От пользователя с ID:{callback.from_user.id} обработана команда \"Отменить удаление проекта\"")
+        logger.info('От пользователя с ID:%s обработана команда "Отменить удаление проекта"', callback.from_user.id)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике отмены удаления проекта: {e}")
+        logger.error("Ошибка в обработчике отмены удаления проекта: %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте позже.")
         await state.clear()
 
@@ -157,7 +171,9 @@ async def process_deadline_input(message: Message, state: FSMContext):
             return
 
         db = router.db
-        success = await db.set_deadline(project_id, deadline, creator_id)
+        # Дедлайн введён в местном времени пользователя, в БД хранится в UTC
+        zone = await get_user_zone(creator_id)
+        success = await db.set_deadline(project_id, to_utc(deadline, zone), creator_id)
 
         if success:
             msg_id = data.get(f"project_msg_{project_id}")
@@ -176,9 +192,9 @@ async def process_deadline_input(message: Message, state: FSMContext):
                         text=new_text,
                         reply_markup=get_project_actions_kb(project_id)
                     )
-                    logger.info(f"Дедлайн проекта {project_id} обновлён")
+                    logger.info("Дедлайн проекта %s обновлён", project_id)
                 except Exception as e:
-                    logger.error(f"Не удалось обновить сообщение {msg_id}: {e}")
+                    logger.error("Не удалось обновить сообщение %s: %s", msg_id, e)
 
             await message.answer(
                 f"Дедлайн успешно установлен:\n<b>{deadline.strftime('%d.%m.%Y %H:%M')}</b>",
@@ -190,7 +206,7 @@ async def process_deadline_input(message: Message, state: FSMContext):
         await state.clear()
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике ввода даты дедлайна: {e}")
+        logger.error("Ошибка в обработчике ввода даты дедлайна: %s", e)
         await message.answer("Произошла ошибка. Попробуйте позже.")
         await state.clear()
 
@@ -206,7 +222,7 @@ async def set_reminder_hours(callback: CallbackQuery, state: FSMContext):
         await notification_settings(callback.message, None)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике установки времени между уведомлениями: {e}")
+        logger.error("Ошибка в обработчике установки времени между уведомлениями: %s", e)
         await message.answer("Произошла ошибка. Попробуйте позже.")
         await state.clear()
 
@@ -233,8 +249,8 @@ async def process_userid_foradd_input(message: Message, state: FSMContext):
         sucess = await db.user_exists(target_id)
         if sucess:
             project_title = data.get(f"project_title_{project_id}")
-            await bot.send_message(chat_id=target_id, text=f"Вас хотят добавить в проект \"{project_title}\"(пользователь с id {user_id})", reply_markup=get_confirmadding_kb(user_id, project_id))
-            await bot.send_message(chat_id=user_id, text="Ожидание подтверждения")
+            await sender.send(target_id, f"Вас хотят добавить в проект \"{project_title}\"(пользователь с id {user_id})", reply_markup=get_confirmadding_kb(user_id, project_id))
+            await sender.send(user_id, "Ожидание подтверждения")
             unikey = await unikey_cipher(project_id, user_id, target_id)
             await state.update_data({"project_id": project_id, "user_id": user_id, "target_id": target_id})
             await db.set_unikey(unikey, True, False)
@@ -244,63 +260,57 @@ async def process_userid_foradd_input(message: Message, state: FSMContext):
         await state.clear()
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике ввода id пользователя для добавления: {e}")
+        logger.error("Ошибка в обработчике ввода id пользователя для добавления: %s", e)
         await message.answer("Произошла ошибка. Попробуйте позже.")
         await state.clear()
 
 
 # Обработка подтверждения добавления в проект
-@router.callback_query(F.data.startswith("accept_addto_"))
-async def accept_adding_query(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(ACCEPT_INVITE)
+async def accept_adding_query(callback: CallbackQuery, state: FSMContext, user_id: int, project_id: int):
     try:
-        command = callback.data
-        logger.info(f"Получена команда {command}")
+        logger.info("Получена команда %s", callback.data)
         target_id = callback.from_user.id
         db = router.db
-        parts = command.split('_')
-        uapid = [int(part) for part in parts if part.isdigit()]
-        unikey = await unikey_cipher(uapid[1], uapid[0], target_id)
-        logger.info(f"Сгенерирован проверочный unikey: {unikey} с параметрами project_id: {uapid[1]}; user_id: {uapid[0]}; target_id: {target_id}")
+        unikey = await unikey_cipher(project_id, user_id, target_id)
+        logger.info("Сгенерирован проверочный unikey: %s с параметрами project_id: %s; user_id: %s; target_id: %s", unikey, project_id, user_id, target_id)
         sucess = await db.unikey_isactive(unikey)
         if sucess:
-            await state.update_data({"project_id": uapid[1], "user_id": uapid[0], "target_id": target_id})
+            await state.update_data({"project_id": project_id, "user_id": user_id, "target_id": target_id})
             await state.set_state(AddMember.answer_collected)
             await db.set_unikey(unikey, True, True)
-            logger.info(f"Приглашение (unikey: {unikey}) принято")
-            await bot.send_message(chat_id=target_id, text=f"Нажмите \"Готово\" для подтверждения принятия приглашения", reply_markup=get_confirm_kb())
+            logger.info("Приглашение (unikey: %s) принято", unikey)
+            await sender.send(target_id, f"Нажмите \"Готово\" для подтверждения принятия приглашения", reply_markup=get_confirm_kb())
         else:
             await callback.message.answer("У вас нет прав")
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике принятия запроса на добавление: {e}")
+        logger.error("Ошибка в обработчике принятия запроса на добавление: %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте позже.")
         await state.clear()
 
 
 # Обработка отказа добавления в проект
-@router.callback_query(F.data.startswith("deny_addto_"))
-async def deny_adding_query(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(DENY_INVITE)
+async def deny_adding_query(callback: CallbackQuery, state: FSMContext, user_id: int, project_id: int):
     try:
-        command = callback.data
-        logger.info(f"Получена команда {command}")
+        logger.info("Получена команда %s", callback.data)
         target_id = callback.from_user.id
         db = router.db
-        parts = command.split('_')
-        uapid = [int(part) for part in parts if part.isdigit()]
-        unikey = await unikey_cipher(uapid[1], uapid[0], target_id)
-        logger.info(f"Сгенерирован проверочный unikey: {unikey} с параметрами project_id: {uapid[1]}; user_id: {uapid[0]}; target_id: {target_id}")
+        unikey = await unikey_cipher(project_id, user_id, target_id)
+        logger.info("Сгенерирован проверочный unikey: %s с параметрами project_id: %s; user_id: %s; target_id: %s", unikey, project_id, user_id, target_id)
         sucess = await db.unikey_isactive(unikey)
         if sucess:
-            await state.update_data({"project_id": uapid[1], "user_id": uapid[0], "target_id": target_id})
+            await state.update_data({"project_id": project_id, "user_id": user_id, "target_id": target_id})
             await state.set_state(AddMember.answer_collected)
             await db.set_unikey(unikey, True, False)
-            logger.info(f"Приглашение (unikey: {unikey}) отклонено")
-            await bot.send_message(chat_id=target_id, text=f"Нажмите \"Готово\" для подтверждения отклонения приглашения", reply_markup=get_confirm_kb())
+            logger.info("Приглашение (unikey: %s) отклонено", unikey)
+            await sender.send(target_id, f"Нажмите \"Готово\" для подтверждения отклонения приглашения", reply_markup=get_confirm_kb())
         else:
             await callback.message.answer("У вас нет прав")
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике отклонения запроса на добавление: {e}")
+        logger.error("Ошибка в обработчике отклонения запроса на добавление: %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте позже.")
 
 
@@ -313,35 +323,38 @@ async def add_toproject(message: Message, state: FSMContext):
         project_id = data.get("project_id")
         user_id = data.get("user_id")
         target_id = data.get("target_id")
-        logger.debug(f"Данные из state: project_id={project_id}, user_id={user_id}, target_id={target_id}")
+        logger.debug("Данные из state: project_id=%s, user_id=%s, target_id=%s", project_id, user_id, target_id)
         unikey = await unikey_cipher(project_id, user_id, target_id)
         sucess = await db.check_unikey(unikey)
 
         if sucess:
             await db.add_member(project_id, target_id, user_id)
-            await bot.send_message(chat_id=user_id, text=f"Приглашенный пользователь с ID:{target_id} принял запрос на добавление в проект с ID:{project_id}")
-            await bot.send_message(chat_id=target_id, text=f"Вы успешно добавлены в проект с ID:{project_id} создателем проекта с ID:{user_id}")
+            await asyncio.gather(
+                sender.send(user_id, f"Приглашенный пользователь с ID:{target_id} принял запрос на добавление в проект с ID:{project_id}"),
+                sender.send(target_id, f"Вы успешно добавлены в проект с ID:{project_id} создателем проекта с ID:{user_id}")
+            )
             await db.set_unikey(unikey, False, True)
         else:
-            await bot.send_message(chat_id=user_id, text=f"Приглашенный пользователь с ID:{target_id} отклонил запрос на добавление в проект с ID:{project_id}")
-            await bot.send_message(chat_id=target_id, text=f"Вы успешно отказались от добавления в проект с ID:{project_id} создателем проекта с ID:{user_id}")
+            await asyncio.gather(
+                sender.send(user_id, f"Приглашенный пользователь с ID:{target_id} отклонил запрос на добавление в проект с ID:{project_id}"),
+                sender.send(target_id, f"Вы успешно отказались от добавления в проект с ID:{project_id} создателем проекта с ID:{user_id}")
+            )
             await db.set_unikey(unikey, False, False)
 
-        logger.info(f"Ответ на приглашение(unikey: {unikey}) обработан")
+        logger.info("Ответ на приглашение(unikey: %s) обработан", unikey)
 
         await state.clear()
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике ответа на запрос добавления: {e}")
+        logger.error("Ошибка в обработчике ответа на запрос добавления: %s", e)
         await message.answer("Произошла ошибка. Попробуйте позже.")
         await state.clear()
 
 
 # Обработка начала добавления участника в проект
-@router.callback_query(F.data.startswith("add_member_"))
-async def start_add_member(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(ADD_MEMBER)
+async def start_add_member(callback: CallbackQuery, state: FSMContext, project_id: int):
     try:
-        project_id = int(callback.data.split("_")[-1])
         await state.update_data(project_id=project_id)
         await callback.message.answer(
             "Введите цифровой id пользователя(получить можно через @GetMyID_Work_Bot):",
@@ -349,9 +362,9 @@ async def start_add_member(callback: CallbackQuery, state: FSMContext):
         )
         await state.set_state(AddMember.input_user_id)
         await callback.answer()
-        logger.info(f"От пользователя с ID:{callback.from_user.id} обработана команда \"Начать добавление участника\"")
+        logger.info('От пользователя с ID:%s обработана команда "Начать добавление участника"', callback.from_user.id)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике добавления участника (начало): {e}")
+        logger.error("Ошибка в обработчике добавления участника (начало): %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
@@ -1,6 +1,10 @@
+import html
 import logging
 from keyboards import *
 from handlers_actions import *
+from aiogram.filters import CommandObject
+from callbacks import DELETE_PROJECT, PROJECT_OPEN, PROJECTS_PAGE, REMINDER_SAVE, REMINDER_TOGGLE, SET_DEADLINE
+from templates import DEFAULT_TIMEZONE, is_valid_zone, render_reminders, to_local
 
 logger = logging.getLogger(__name__)
 
@@ -9,20 +13,20 @@ logger = logging.getLogger(__name__)
 async def cmd_start(message: types.Message):
     try:
         db = router.db
-        await db.execute(
-            "INSERT INTO users (user_id, username, full_name) VALUES ($1, $2, $3) ON CONFLICT DO NOTHING",
+        await db.register_user(
             message.chat.id,
             message.from_user.username,
-            message.from_user.full_name
+            message.from_user.full_name,
+            message.from_user.language_code
         )
         await message.answer(
             "Добро пожаловать! Давайте управлять проектами.",
             reply_markup=get_main_kb()
         )
-        logger.info(f"От пользователя с ID:{message.chat.id} обработана команда /start")
+        logger.info("От пользователя с ID:%s обработана команда /start", message.chat.id)
 
     except Exception as e:
-            logger.error(f"Ошибка в обработчике команды start: {e}")
+            logger.error("Ошибка в обработчике команды start: %s", e)
             await callback.message.answer("Произошла ошибка. Попробуйте снова.")
             await state.clear()
 
@@ -34,55 +38,120 @@ async def create_project_start(message: types.Message, state: FSMContext):
         await message.answer("Введите название проекта:", reply_markup=get_cancel_kb())
         await state.set_state(CreateProject.enter_title)
 
-        logger.info(f"От пользователя с ID:{message.chat.id} обработана команда \"Создать проект\"")
+        logger.info('От пользователя с ID:%s обработана команда "Создать проект"', message.chat.id)
 
     except Exception as e:
-            logger.error(f"Ошибка в обработчике создания проекта(начало): {e}")
+            logger.error("Ошибка в обработчике создания проекта(начало): %s", e)
             await message.answer("Произошла ошибка. Попробуйте снова.")
             await state.clear()
 
 
-# Обработка "Мои проекты" (основная клавиатура)
+PROJECTS_PAGE_SIZE = 10
+
+
+# Текст страницы списка проектов (дедлайны - в часовом поясе пользователя)
+def render_projects_page(projects, zone) -> str:
+    lines = ["Ваши проекты:\n"]
+    for p in projects:
+        deadline = to_local(p['deadline'], zone).strftime('%d.%m.%Y %H:%M') if p['deadline'] else "не установлен"
+        lines.append(f"№{p['id']}: {html.escape(p['title'])} (дедлайн: {deadline})")
+    lines.append("\nВыберите проект:")
+    return "\n".join(lines)
+
+
+# Обработка "Мои проекты" (основная клавиатура) - одна страница проектов одним сообщением
 @router.message(F.text == "Мои проекты")
 async def my_projects(message: types.Message, state: FSMContext):
     try:
         db = router.db
-        projects = await db.get_user_projects(message.chat.id)
+        projects, has_prev, has_next = await db.get_user_projects_page(message.chat.id, limit=PROJECTS_PAGE_SIZE)
 
         if not projects:
             await message.answer("У вас нет проектов.")
-            logger.info(f"От пользователя с ID:{message.chat.id} обработана команда \"Мои проекты\"")
+            logger.info('От пользователя с ID:%s обработана команда "Мои проекты"', message.chat.id)
             return
 
-        for p in projects:
-            text = f"Проект №{p['id']}: {p['title']}\n"
-            if p['deadline']:
-                text += f"Дедлайн: {p['deadline'].strftime('%d.%m.%Y %H:%M')}\n"
-            else:
-                text += "Дедлайн не установлен\n"
-
-            sent_msg = await message.answer(
-                text,
-                reply_markup=get_project_actions_kb(p['id'])
-            )
-            await state.update_data({
-                f"project_msg_{p['id']}": sent_msg.message_id,
-                f"project_title_{p['id']}": p['title']
-            })
+        await message.answer(
+            render_projects_page(projects, await get_user_zone(message.chat.id)),
+            reply_markup=get_projects_page_kb(projects, has_prev, has_next)
+        )
 
-        logger.info(f"От пользователя с ID:{message.chat.id} обработана команда \"Мои проекты\"")
+        logger.info('От пользователя с ID:%s обработана команда "Мои проекты"', message.chat.id)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике получения списка проектов: {e}")
+        logger.error("Ошибка в обработчике получения списка проектов: %s", e)
         await message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
 
+# Обработка листания списка проектов (инлайн-клавиатура "Мои проекты")
+@callbacks.handler(PROJECTS_PAGE)
+async def my_projects_page(callback: CallbackQuery, state: FSMContext, forward: int, project_id: int):
+    try:
+        db = router.db
+        if forward:
+            page = await db.get_user_projects_page(callback.from_user.id, after_id=project_id, limit=PROJECTS_PAGE_SIZE)
+        else:
+            page = await db.get_user_projects_page(callback.from_user.id, before_id=project_id, limit=PROJECTS_PAGE_SIZE)
+        projects, has_prev, has_next = page
+
+        if not projects:
+            await callback.answer("Проектов больше нет.")
+            return
+
+        await callback.message.edit_text(
+            render_projects_page(projects, await get_user_zone(callback.from_user.id)),
+            reply_markup=get_projects_page_kb(projects, has_prev, has_next)
+        )
+        await callback.answer()
+
+    except Exception as e:
+        logger.error("Ошибка в обработчике листания списка проектов: %s", e)
+        await callback.message.answer("Произошла ошибка. Попробуйте снова.")
+        await state.clear()
+
+
+# Обработка выбора проекта из списка (инлайн-клавиатура "Мои проекты")
+@callbacks.handler(PROJECT_OPEN)
+async def open_project(callback: CallbackQuery, state: FSMContext, project_id: int):
+    try:
+        db = router.db
+        p = await db.get_user_project(project_id, callback.from_user.id)
+
+        if not p:
+            await callback.answer("Проект не найден.")
+            return
+
+        text = f"Проект №{p['id']}: {html.escape(p['title'])}\n"
+        if p['deadline']:
+            deadline = to_local(p['deadline'], await get_user_zone(callback.from_user.id))
+            text += f"Дедлайн: {deadline.strftime('%d.%m.%Y %H:%M')}\n"
+        else:
+            text += "Дедлайн не установлен\n"
+
+        # Изменять и удалять проект может только создатель, участнику (из сводки напоминаний) - без кнопок
+        is_creator = p['creator_id'] == callback.from_user.id
+        sent_msg = await callback.message.answer(
+            text,
+            reply_markup=get_project_actions_kb(p['id']) if is_creator else None
+        )
+        await state.update_data({
+            f"project_msg_{p['id']}": sent_msg.message_id,
+            f"project_title_{p['id']}": p['title']
+        })
+        await callback.answer()
+        logger.info('От пользователя с ID:%s обработана команда "Открыть проект"', callback.from_user.id)
+
+    except Exception as e:
+        logger.error("Ошибка в обработчике выбора проекта: %s", e)
+        await callback.message.answer("Произошла ошибка. Попробуйте снова.")
+        await state.clear()
+
+
 # Обработка удаления проекта (инлайн-клавиатура "действия с проектом")
-@router.callback_query(F.data.startswith("delete_project_"))
-async def delete_project(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.handler(DELETE_PROJECT)
+async def delete_project(callback: types.CallbackQuery, state: FSMContext, project_id: int):
     try:
-        project_id = int(callback.data.split("_")[-1])
         await state.update_data(project_id=project_id)
 
         await callback.message.answer(
@@ -90,19 +159,18 @@ async def delete_project(callback: types.CallbackQuery, state: FSMContext):
             reply_markup=get_confirm_deletion_kb(project_id)
         )
         await state.set_state(DeleteProject.confirm)
-        logger.info(f"Пользователь {callback.from_user.id} начал удаление проекта {project_id}")
+        logger.info("Пользователь %s начал удаление проекта %s", callback.from_user.id, project_id)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике удаления проекта(начало): {e}")
+        logger.error("Ошибка в обработчике удаления проекта(начало): %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
 
 # Обработка установки дедлайна (инлайн-клавиатура "действия с проектом")
-@router.callback_query(F.data.startswith("set_deadline_"))
-async def start_set_deadline(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(SET_DEADLINE)
+async def start_set_deadline(callback: CallbackQuery, state: FSMContext, project_id: int):
     try:
-        project_id = int(callback.data.split("_")[-1])
         await state.update_data(project_id=project_id)
         await callback.message.answer(
             "Введите дедлайн в формате:\n<b>ДД.ММ.ГГГГ ЧЧ:ММ</b>\n\n"
@@ -112,36 +180,64 @@ async def start_set_deadline(callback: CallbackQuery, state: FSMContext):
         )
         await state.set_state(SetDeadline.input_date)
         await callback.answer()
-        logger.info(f"От пользователя с ID:{callback.from_user.id} обработана команда \"Начать установку дедлайна\"")
+        logger.info('От пользователя с ID:%s обработана команда "Начать установку дедлайна"', callback.from_user.id)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике установки дедлайна(начало): {e}")
+        logger.error("Ошибка в обработчике установки дедлайна(начало): %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
 
-# Обработка вызова ручной проверки уведомлений
+# Обработка вызова ручной проверки уведомлений: напоминания по всем будущим дедлайнам пользователя
 @router.message(F.text == "Проверить уведомления")
-async def check_notifications(message: Message):
+async def check_notifications(message: Message, state: FSMContext):
     try:
-        user_id=message.chat.id,
-        projects = await db.fetch(
-            "SELECT * FROM projects WHERE creator_id = $1 AND next_notification <= NOW()",
-            user_id
-        )
-        for project in projects:
-            deadline = project["deadline"]
-            hours_left = (deadline - datetime.now()).total_seconds() // 3600
+        db = router.db
+        user_id = message.chat.id
+        timezone, language_code = await db.get_user_locale(user_id)
+        now = datetime.utcnow()
+        projects = [
+            {**dict(p), "timezone": timezone, "language_code": language_code}
+            for p in await db.get_user_projects(user_id)
+            if p["deadline"] and p["deadline"] > now
+        ]
+        if not projects:
+            await message.answer("Ближайших дедлайнов нет.")
+            return
+        for p, text in zip(projects, render_reminders(projects, now)):
+            await message.answer(text, reply_markup=get_project_actions_kb(p["id"]))
+    except Exception as e:
+        logger.error("Ошибка в обработчике ручной проверки просроченных уведомлений: %s", e)
+        await message.answer("Произошла ошибка. Попробуйте снова.")
+        await state.clear()
+
+
+# Обработка /timezone: показать или выбрать часовой пояс (имя IANA, например Europe/Moscow)
+@router.message(Command("timezone"))
+async def set_timezone(message: Message, command: CommandObject):
+    try:
+        db = router.db
+        user_id = message.chat.id
+        name = (command.args or "").strip()
+        if not name:
+            timezone, _ = await db.get_user_locale(user_id)
             await message.answer(
-                f"⚠️ Напоминание! Проект «{project['title']}»\n"
-                f"Дедлайн через {int(hours_left)} часов!",
-                reply_markup=get_project_actions_kb(project["id"])
+                f"Ваш часовой пояс: {timezone or DEFAULT_TIMEZONE}\n"
+                "Чтобы изменить: /timezone Europe/Moscow"
             )
-            await schedule_next_notification(project["id"])
+            return
+        if not is_valid_zone(name):
+            await message.answer("Неизвестный часовой пояс. Пример: /timezone Europe/Moscow")
+            return
+        if await db.set_user_timezone(user_id, name):
+            await message.answer(f"Часовой пояс установлен: {name}. Дедлайны вводятся и показываются в нём.")
+        else:
+            await message.answer("Сначала запустите бота командой /start")
+        logger.info("От пользователя с ID:%s обработана команда /timezone", user_id)
+
     except Exception as e:
-        logger.error(f"Ошибка в обработчике ручной проверки просроченных уведомлений: {e}")
+        logger.error("Ошибка в обработчике команды timezone: %s", e)
         await message.answer("Произошла ошибка. Попробуйте снова.")
-        await state.clear()
 
 
 # Обработка вызова настроек уведомлений
@@ -156,12 +252,13 @@ async def show_notifications(message: Message, state: FSMContext):
             settings = {"enable_reminders": True, "reminder_hours": [24, 6, 1]}
         await message.answer(
             f"Включены: {settings['enable_reminders']}\n"
-            f"За сколько часов до дедлайна отправлять уведомления: {settings['reminder_hours']}",
+            f"За сколько часов до дедлайна отправлять уведомления: {settings['reminder_hours']}\n"
+            f"Сводка (несколько напоминаний одним сообщением): {'да' if settings.get('digest') else 'нет'}",
             reply_markup=get_notifications_kb()
         )
         logger.info("Меню настроек отправлено user_id=%d", user_id)
     except Exception as e:
-        logger.error(f"Ошибка в обработчике вызова настроек уведомлений: {e}")
+        logger.error("Ошибка в обработчике вызова настроек уведомлений: %s", e)
         await message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
@@ -175,7 +272,7 @@ async def enable_notifications(message: Message, state: FSMContext):
         await message.answer("Уведомления включены ✅", reply_markup=get_notifications_kb())
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике кнопок настроек(включение уведомлений): {e}")
+        logger.error("Ошибка в обработчике кнопок настроек(включение уведомлений): %s", e)
         await message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
@@ -188,7 +285,24 @@ async def disable_notifications(message: Message, state: FSMContext):
         await message.answer("Уведомления отключены ❌", reply_markup=get_notifications_kb())
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике кнопок настроек(выключение уведомлений): {e}")
+        logger.error("Ошибка в обработчике кнопок настроек(выключение уведомлений): %s", e)
+        await message.answer("Произошла ошибка. Попробуйте снова.")
+        await state.clear()
+
+
+@router.message(F.text == "Сводка напоминаний")
+async def toggle_digest(message: Message, state: FSMContext):
+    try:
+        db = router.db
+        digest = await db.toggle_digest(message.chat.id)
+        await message.answer(
+            "Напоминания о нескольких проектах будут приходить одним сообщением ✅" if digest
+            else "Напоминания будут приходить отдельным сообщением по каждому проекту",
+            reply_markup=get_notifications_kb()
+        )
+
+    except Exception as e:
+        logger.error("Ошибка в обработчике кнопок настроек(режим сводки): %s", e)
         await message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
@@ -200,7 +314,7 @@ async def back_to_main(message: Message, state: FSMContext):
         await state.clear()
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике кнопок настроек(возврат в главное меню): {e}")
+        logger.error("Ошибка в обработчике кнопок настроек(возврат в главное меню): %s", e)
         await message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
@@ -229,57 +343,35 @@ async def select_reminder_intervals(message: Message, state: FSMContext):
             )
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике кнопок настроек(выбор интервалов между уведомлениями): {e}")
+        logger.error("Ошибка в обработчике кнопок настроек(выбор интервалов между уведомлениями): %s", e)
         await message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
 
-@router.callback_query(F.data == "reminder_save")
+@callbacks.handler(REMINDER_SAVE)
 async def save_reminder_settings(callback: CallbackQuery, state: FSMContext):
     try:
         await callback.answer("Настройки сохранены!")
         await show_notifications(callback.message, state)
     except Exception as e:
-        logger.error(f"Ошибка в обработчике кнопок настроек(сохранение интервалов): {e}")
+        logger.error("Ошибка в обработчике кнопок настроек(сохранение интервалов): %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
 
 
 # Обработка обновления интервалов
-@router.callback_query(F.data.startswith("reminder_toggle_"))
-async def toggle_reminder_hour(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(REMINDER_TOGGLE)
+async def toggle_reminder_hour(callback: CallbackQuery, state: FSMContext, hour: int):
     try:
         user_id = callback.from_user.id
-        hour = int(callback.data.split("_")[-1])
         db = router.db
-        settings = await db.get_notification_settings(user_id)
-        hours = settings["reminder_hours"] if settings else []
-        if hour in hours:
-            hours.remove(hour)
-        else:
-            hours.append(hour)
-        await db.update_notification_settings(
-            user_id=user_id,
-            enable_reminders=True,
-            reminder_hours=hours
-        )
+        settings = await db.toggle_reminder_hour(user_id, hour)
+        hours = list(settings["reminder_hours"])
 
         await callback.answer(f"Интервалы обновлены: {hours}")
         await select_reminder_intervals(callback.message, state)
 
     except Exception as e:
-        logger.error(f"Ошибка в обработчике обновления интервалов: {e}")
+        logger.error("Ошибка в обработчике обновления интервалов: %s", e)
         await callback.message.answer("Произошла ошибка. Попробуйте снова.")
         await state.clear()
-
-
-# Сохранение настроек уведомлений
-@router.callback_query(F.data == "reminder_save")
-async def save_reminder_settings(callback: CallbackQuery, state: FSMContext):
-    try:
-        await callback.answer("Настройки сохранены!")
-        await show_notifications(callback.message, state)
-    except Exception as e:
-        logger.error(f"Ошибка в обработчике кнопок настроек(сохранение интервалов): {e}")
-        await callback.message.answer("Произошла ошибка. Попробуйте позже.")
-        await state.clear()
@@ -1,13 +1,41 @@
+import os
 from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
     InlineKeyboardMarkup,
     InlineKeyboardButton
 )
+from dotenv import load_dotenv
+from cache import TTLCache
+from callbacks import (
+    ACCEPT_INVITE, ADD_MEMBER, BACK_TO_MAIN, CANCEL_DELETION, CONFIRM_DELETE, DELETE_PROJECT, DENY_INVITE,
+    EDIT_REMINDERS, PROJECT_OPEN, PROJECTS_PAGE, REMINDER_SAVE, REMINDER_TOGGLE, SET_DEADLINE
+)
 
+load_dotenv()
 
+# Сколько клавиатур с id проектов/пользователей держать в памяти (вытеснение по LRU)
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", "10000"))
 
-def get_main_kb() -> ReplyKeyboardMarkup:
+# Одна и та же клавиатура отдаётся во все апдейты: статические собираются один раз при импорте,
+# клавиатуры с параметрами - при первом запросе. Модели aiogram изменяемые (frozen=False), поэтому
+# возвращённые клавиатуры менять нельзя - изменение попадёт в кэш и уйдёт всем пользователям;
+# чтобы дополнить клавиатуру, соберите новую (или возьмите копию: kb.model_copy(deep=True)).
+_keyboards = TTLCache("keyboards", KEYBOARD_CACHE_SIZE, None)
+
+
+# Клавиатура из кэша по ключу (имя фабрики, параметры), при промахе - собирается и запоминается
+def _cached(build, *args):
+    key = (build.__name__, *args)
+    kb = _keyboards.get(key)
+    if kb is None:
+        kb = build(*args)
+        _keyboards.set(key, kb)
+    return kb
+
+
+
+def _build_main_kb() -> ReplyKeyboardMarkup:
     buttons = [
         [KeyboardButton(text="Создать проект")],
         [KeyboardButton(text="Мои проекты")],
@@ -17,24 +45,24 @@ def get_main_kb() -> ReplyKeyboardMarkup:
 
 
 
-def get_project_actions_kb(project_id: int) -> InlineKeyboardMarkup:
+def _build_project_actions_kb(project_id: int) -> InlineKeyboardMarkup:
     buttons = [
         [
             InlineKeyboardButton(
                 text="Удалить проект",
-                callback_data=f"delete_project_{project_id}"
+                callback_data=DELETE_PROJECT.pack(project_id)
             )
         ],
         [
             InlineKeyboardButton(
                 text="Добавить участника",
-                callback_data=f"add_member_{project_id}"
+                callback_data=ADD_MEMBER.pack(project_id)
             )
         ],
         [
             InlineKeyboardButton(
                 text="Установить дедлайн",
-                callback_data=f"set_deadline_{project_id}"
+                callback_data=SET_DEADLINE.pack(project_id)
             )
         ]
     ]
@@ -42,24 +70,46 @@ def get_project_actions_kb(project_id: int) -> InlineKeyboardMarkup:
 
 
 
-def get_cancel_kb() -> ReplyKeyboardMarkup:
+# Страница списка проектов зависит от названий проектов пользователя и не кэшируется
+def get_projects_page_kb(projects, has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    buttons = [
+        [
+            InlineKeyboardButton(
+                text=f"№{p['id']}: {p['title'][:40]}",
+                callback_data=PROJECT_OPEN.pack(p['id'])
+            )
+        ]
+        for p in projects
+    ]
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton(text="◀️ Назад", callback_data=PROJECTS_PAGE.pack(0, projects[0]['id'])))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Вперёд ▶️", callback_data=PROJECTS_PAGE.pack(1, projects[-1]['id'])))
+    if nav:
+        buttons.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+
+def _build_cancel_kb() -> ReplyKeyboardMarkup:
     buttons = [[KeyboardButton(text="Отмена")]]
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
 
 
-def get_confirm_deletion_kb(project_id: int) -> InlineKeyboardMarkup:
+def _build_confirm_deletion_kb(project_id: int) -> InlineKeyboardMarkup:
     buttons = [
         [
             InlineKeyboardButton(
                 text="Да, удалить",
-                callback_data=f"confirm_delete_{project_id}"
+                callback_data=CONFIRM_DELETE.pack(project_id)
             )
         ],
         [
             InlineKeyboardButton(
                 text="Отменить",
-                callback_data="cancel_deletion"
+                callback_data=CANCEL_DELETION.pack()
             )
         ]
     ]
@@ -67,15 +117,16 @@ def get_confirm_deletion_kb(project_id: int) -> InlineKeyboardMarkup:
 
 
 
-def get_notifications_kb():
+def _build_notifications_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(keyboard=[
         [KeyboardButton(text="Включить уведомления"), KeyboardButton(text="Отключить уведомления")],
-        [KeyboardButton(text="Выбрать интервалы"), KeyboardButton(text="Назад")]
+        [KeyboardButton(text="Сводка напоминаний"), KeyboardButton(text="Выбрать интервалы")],
+        [KeyboardButton(text="Назад")]
     ], resize_keyboard=True)
 
 
 
-def get_reminder_kb():
+def _build_reminder_kb() -> InlineKeyboardMarkup:
     hours = [1, 2, 6, 12, 24]
     buttons = []
 
@@ -83,50 +134,110 @@ def get_reminder_kb():
         row = [
             InlineKeyboardButton(
                 text=f"{h} ч",
-                callback_data=f"reminder_toggle_{h}"
+                callback_data=REMINDER_TOGGLE.pack(h)
             )
             for h in hours[i:i+3]
         ]
         buttons.append(row)
 
     buttons.append([
-        InlineKeyboardButton(text="Сохранить", callback_data="reminder_save")
+        InlineKeyboardButton(text="Сохранить", callback_data=REMINDER_SAVE.pack())
     ])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-def get_notification_settings_kb():
+def _build_notification_settings_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
                 text="Изменить интервалы",
-                callback_data="edit_reminders"
+                callback_data=EDIT_REMINDERS.pack()
             )
         ],
         [
             InlineKeyboardButton(
                 text="Назад",
-                callback_data="back_to_main"
+                callback_data=BACK_TO_MAIN.pack()
             )
         ]
     ])
 
-def get_confirmadding_kb(user_id: int, project_id: int) -> InlineKeyboardMarkup:
+def _build_confirmadding_kb(user_id: int, project_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
                 text="Разрешить",
-                callback_data=f"accept_addto_{user_id}_{project_id}"
+                callback_data=ACCEPT_INVITE.pack(user_id, project_id)
             )
         ],
         [
             InlineKeyboardButton(
                 text="Запретить",
-                callback_data=f"deny_addto_{user_id}_{project_id}"
+                callback_data=DENY_INVITE.pack(user_id, project_id)
             )
         ]
     ])
 
-def get_confirm_kb() -> ReplyKeyboardMarkup:
+def _build_confirm_kb() -> ReplyKeyboardMarkup:
     buttons = [[KeyboardButton(text="Готово")]]
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
+
+
+
+_MAIN_KB = _build_main_kb()
+_CANCEL_KB = _build_cancel_kb()
+_NOTIFICATIONS_KB = _build_notifications_kb()
+_REMINDER_KB = _build_reminder_kb()
+_NOTIFICATION_SETTINGS_KB = _build_notification_settings_kb()
+_CONFIRM_KB = _build_confirm_kb()
+
+
+def get_main_kb() -> ReplyKeyboardMarkup:
+    return _MAIN_KB
+
+
+def get_cancel_kb() -> ReplyKeyboardMarkup:
+    return _CANCEL_KB
+
+
+def get_notifications_kb() -> ReplyKeyboardMarkup:
+    return _NOTIFICATIONS_KB
+
+
+def get_reminder_kb() -> InlineKeyboardMarkup:
+    return _REMINDER_KB
+
+
+def get_notification_settings_kb() -> InlineKeyboardMarkup:
+    return _NOTIFICATION_SETTINGS_KB
+
+
+def get_confirm_kb() -> ReplyKeyboardMarkup:
+    return _CONFIRM_KB
+
+
+def get_project_actions_kb(project_id: int) -> InlineKeyboardMarkup:
+    return _cached(_build_project_actions_kb, project_id)
+
+
+def get_confirm_deletion_kb(project_id: int) -> InlineKeyboardMarkup:
+    return _cached(_build_confirm_deletion_kb, project_id)
+
+
+def get_confirmadding_kb(user_id: int, project_id: int) -> InlineKeyboardMarkup:
+    return _cached(_build_confirmadding_kb, user_id, project_id)
+
+
+
+# Кнопки в проекты из сводки напоминаний: по номеру проекта, несколько в ряд
+DIGEST_ROW_SIZE = 4
+
+
+def get_digest_kb(project_ids: list[int]) -> InlineKeyboardMarkup:
+    buttons = [
+        InlineKeyboardButton(text=f"№{project_id}", callback_data=PROJECT_OPEN.pack(project_id))
+        for project_id in project_ids
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        buttons[i:i + DIGEST_ROW_SIZE] for i in range(0, len(buttons), DIGEST_ROW_SIZE)
+    ])
@@ -0,0 +1,198 @@
+# Многопроцессный режим: главный процесс получает сырые апдейты (getUpdates или вебхук)
+# и раскладывает их по N процессам-воркерам по chat_id, так что все апдейты одного чата
+# обрабатывает один воркер в порядке поступления. Планировщик напоминаний работает только в воркере,
+# захватившем лидерство (advisory lock в PostgreSQL, см. leader.py).
+# Запуск: python launcher.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import aiohttp
+from dotenv import load_dotenv
+from updates import ChatSerializer, chat_id_of
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL") or "https://api.telegram.org"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WORKERS = int(os.getenv("WORKERS", str(os.cpu_count() or 1)))
+# Сколько апдейтов один воркер обрабатывает одновременно (разных чатов)
+WORKER_MAX_CONCURRENCY = int(os.getenv("WORKER_MAX_CONCURRENCY", "100"))
+# Сколько полученных апдейтов воркер держит в ожидании обработки, прежде чем перестать читать очередь
+WORKER_MAX_PENDING = int(os.getenv("WORKER_MAX_PENDING", str(WORKER_MAX_CONCURRENCY * 10)))
+POLLING_TIMEOUT = int(os.getenv("POLLING_TIMEOUT", "30"))
+
+
+# Номер воркера для апдейта (апдейты без чата - воркеру №0)
+def shard_of(update: dict, workers: int) -> int:
+    chat_id = chat_id_of(update)
+    if chat_id is None:
+        return 0
+    return chat_id % workers
+
+
+# ---------- Воркер ----------
+
+async def worker_main(index: int, queue: multiprocessing.Queue, rate_state):
+    from main import DB_DSN, build_dispatcher, start_scheduler
+    from metrics import METRICS_PORT, start_metrics_server
+    from bot import bot
+    from db import Database
+    from sender import sender
+
+    db = Database(DB_DSN)
+    await db.connect()
+    await db.warm_known_users()
+    dp = build_dispatcher(db, sharded=True)
+
+    # Лимит Telegram общий на бота - один bucket в разделяемой памяти на все воркеры:
+    # волну напоминаний лидер отправляет на полной скорости, когда остальные молчат
+    sender.share_global_bucket(rate_state)
+    sender.start()
+
+    leader = start_scheduler(db)
+    # У каждого воркера свои метрики - свой порт METRICS_PORT + номер воркера
+    metrics_runner = await start_metrics_server(port=METRICS_PORT + index if METRICS_PORT else 0)
+    logger.info("Воркер №%d запущен", index)
+
+    chats = ChatSerializer(WORKER_MAX_CONCURRENCY)
+    pending = asyncio.Semaphore(WORKER_MAX_PENDING)
+    tasks = set()
+    loop = asyncio.get_running_loop()
+
+    async def process(update: dict):
+        try:
+            async with chats.hold(chat_id_of(update)):
+                await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.error("Воркер №%d: ошибка обработки апдейта %s: %s", index, update.get("update_id"), e)
+        finally:
+            pending.release()
+
+    try:
+        while True:
+            update = await loop.run_in_executor(None, queue.get)
+            if update is None:
+                break
+            await pending.acquire()
+            task = asyncio.create_task(process(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await dp.storage.close()
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        await sender.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+        await db.pool.close()
+        logger.info("Воркер №%d остановлен", index)
+
+
+def run_worker(index: int, queue: multiprocessing.Queue, rate_state, log_queue: multiprocessing.Queue):
+    from logger import setup_logging
+    setup_logging(log_queue)
+    try:
+        asyncio.run(worker_main(index, queue, rate_state))
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------- Главный процесс ----------
+
+# Long polling getUpdates без разбора апдейтов в модели aiogram (разбор - в воркерах)
+async def poll_updates(queues: list):
+    base = f"{TELEGRAM_API_URL.rstrip('/')}/bot{BOT_TOKEN}"
+    offset = None
+    timeout = aiohttp.ClientTimeout(total=POLLING_TIMEOUT + 10)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.post(f"{base}/deleteWebhook"):
+            pass
+        while True:
+            try:
+                params = {"timeout": POLLING_TIMEOUT}
+                if offset is not None:
+                    params["offset"] = offset
+                async with session.post(f"{base}/getUpdates", json=params) as response:
+                    payload = await response.json()
+                if not payload.get("ok"):
+                    logger.error("getUpdates вернул ошибку: %s", payload)
+                    await asyncio.sleep(payload.get("parameters", {}).get("retry_after", 1))
+                    continue
+                for update in payload["result"]:
+                    queues[shard_of(update, len(queues))].put(update)
+                    offset = update["update_id"] + 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка получения апдейтов: %s", e)
+                await asyncio.sleep(1)
+
+
+# Приём апдейтов вебхуком и раскладка по воркерам: сервер и регистрация вебхука - из webhook.py,
+# апдейты не разбираются, а сразу уходят воркеру своего чата
+async def serve_webhook(queues: list):
+    from aiogram import Dispatcher
+    from bot import bot
+    from handlers_commands import router  # с обработчиками команд и кнопок
+    from webhook import WebhookServer
+
+    class ShardingWebhookServer(WebhookServer):
+        async def accept(self, data: dict):
+            queues[shard_of(data, len(queues))].put(data)
+
+    # Диспетчер нужен только для allowed_updates в setWebhook: обработчики работают в воркерах
+    dp = Dispatcher()
+    dp.include_router(router)
+    server = ShardingWebhookServer(dp, bot)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        await bot.session.close()
+
+
+def main():
+    from logger import setup_logging, start_listener
+    from sender import SENDER_GLOBAL_RATE
+
+    if not BOT_TOKEN:
+        raise ValueError("Переменная BOT_TOKEN не найдена в .env")
+
+    context = multiprocessing.get_context("spawn")
+    # Логи всех процессов идут через одну очередь в поток-слушатель главного процесса (один файл, одна ротация)
+    log_queue = context.Queue()
+    start_listener(log_queue)
+    setup_logging(log_queue)
+    queues = [context.Queue() for _ in range(WORKERS)]
+    # Состояние общего token bucket отправки: (токены, время обновления)
+    rate_state = context.Array("d", [SENDER_GLOBAL_RATE, time.monotonic()])
+    processes = [
+        context.Process(target=run_worker, args=(i, queues[i], rate_state, log_queue), name=f"worker-{i}")
+        for i in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    logger.info("Запущено воркеров: %d (режим %s)", WORKERS, BOT_MODE)
+
+    try:
+        asyncio.run(serve_webhook(queues) if BOT_MODE == "webhook" else poll_updates(queues))
+    except KeyboardInterrupt:
+        logger.info("Остановка по Ctrl+C")
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
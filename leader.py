@@ -0,0 +1,90 @@
+import asyncio
+import asyncpg
+import logging
+import os
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Ключ advisory lock'а лидера фоновых задач (любое число, одинаковое для всех экземпляров бота)
+LEADER_LOCK_KEY = int(os.getenv("LEADER_LOCK_KEY", "815200101"))
+# Как часто не-лидер пробует захватить лидерство и лидер проверяет своё соединение (сек)
+LEADER_RETRY_INTERVAL = float(os.getenv("LEADER_RETRY_INTERVAL", "5"))
+
+
+# Лидерство через PostgreSQL advisory lock на отдельном соединении (не из пула: пул при возврате
+# соединения делает pg_advisory_unlock_all). Если процесс-лидер умирает, сессия закрывается,
+# PostgreSQL сам снимает блокировку, и её забирает следующий экземпляр.
+class LeaderLock:
+    def __init__(self, dsn: str, key: int = LEADER_LOCK_KEY, retry_interval: float = LEADER_RETRY_INTERVAL):
+        self.dsn = dsn
+        self.key = key
+        self.retry_interval = retry_interval
+        self._conn = None
+
+
+# Ждать, пока не станем лидером
+    async def acquire(self):
+        while True:
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._conn = await asyncpg.connect(self.dsn)
+                if await self._conn.fetchval("SELECT pg_try_advisory_lock($1);", self.key):
+                    logger.info("Получено лидерство (advisory lock %d)", self.key)
+                    return
+            except Exception as e:
+                logger.error("Ошибка захвата лидерства: %s", e)
+                await self._close()
+            await asyncio.sleep(self.retry_interval)
+
+
+# Ждать потери лидерства (обрыв соединения, на котором держится блокировка)
+    async def wait_lost(self):
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                await asyncio.wait_for(self._conn.fetchval("SELECT 1;"), timeout=self.retry_interval)
+            except Exception as e:
+                logger.error("Лидерство потеряно: %s", e)
+                await self._close()
+                return
+
+
+    async def release(self):
+        if self._conn is not None and not self._conn.is_closed():
+            try:
+                await self._conn.fetchval("SELECT pg_advisory_unlock($1);", self.key)
+            except Exception as e:
+                logger.error("Ошибка снятия блокировки лидера: %s", e)
+        await self._close()
+
+
+    async def _close(self):
+        if self._conn is not None:
+            try:
+                await self._conn.close(timeout=1)
+            except Exception:
+                self._conn.terminate()
+            self._conn = None
+
+
+# Выполнять задачу только пока этот процесс - лидер: при потере лидерства (или падении задачи)
+# задача останавливается, блокировка отпускается, и процесс снова встаёт в очередь на лидерство.
+async def run_as_leader(lock: LeaderLock, start, stop):
+    while True:
+        await lock.acquire()
+        task = asyncio.create_task(start())
+        lost = asyncio.create_task(lock.wait_lost())
+        try:
+            await asyncio.wait({task, lost}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for t in (task, lost):
+                t.cancel()
+            await asyncio.gather(task, lost, return_exceptions=True)
+            try:
+                await stop()
+            finally:
+                await lock.release()
+        await asyncio.sleep(lock.retry_interval)
@@ -1,11 +1,73 @@
+import atexit
 import logging
+import os
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from dotenv import load_dotenv
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(name)s | %(levelname)s | %(message)s",
-    handlers=[
-        logging.FileHandler("bot.log"),
+load_dotenv()
+
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Уровни отдельных модулей: "db=WARNING,handlers_actions=DEBUG,aiogram=INFO"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "aiogram=INFO")
+# Ротация файла лога по размеру
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+LOG_FORMAT = "%(asctime)s | %(processName)s | %(name)s | %(levelname)s | %(message)s"
+
+
+def _parse_levels(value: str) -> dict:
+    levels = {}
+    for item in value.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+# Обработчики, которые реально пишут логи (работают в потоке слушателя, а не в event loop)
+def _output_handlers() -> list:
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [
+        RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"),
         logging.StreamHandler(sys.stdout)
     ]
-)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+# Фоновый поток, который забирает записи из очереди и пишет их в файл и stdout
+def start_listener(log_queue) -> QueueListener:
+    listener = QueueListener(log_queue, *_output_handlers(), respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener: QueueListener):
+    if listener._thread is not None:
+        listener.stop()
+
+
+# Настройка логирования процесса: в event loop запись только кладётся в очередь.
+# log_queue - очередь процесса-родителя (воркеры launcher.py пишут через неё в общий файл);
+# без неё процесс заводит свою очередь и поток-слушатель.
+def setup_logging(log_queue=None) -> QueueListener | None:
+    listener = None
+    if log_queue is None:
+        log_queue = queue.SimpleQueue()
+        listener = start_listener(log_queue)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+    return listener
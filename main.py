@@ -1,79 +1,118 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 import os
 from db import Database
+from leader import LeaderLock, run_as_leader
+from scheduler import ReminderScheduler
+from sender import sender
+from storage import PostgresStorage
+from webhook import run_webhook
 from handlers_commands import *
 from handlers_actions import router
-import logger
+from logger import setup_logging
+from metrics import start_metrics_server
+from middlewares import ApiTracingMiddleware, HandlerMetricsMiddleware, RateLimitMiddleware, TracingMiddleware
+from tracing import TRACING
 from bot import bot
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
-
-logging.getLogger('aiogram').setLevel(logging.INFO)
-
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 DB_DSN = os.getenv("DB_DSN")
+# Хранилище FSM: postgres (общее для процессов, переживает рестарт) или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres")
+# Режим получения апдейтов: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Кэш FSM в памяти процесса (storage.PostgresStorage): "1" или "0". По умолчанию включён, если апдейты
+# одного чата гарантированно попадают в один процесс (polling, launcher.py), и выключен в режиме вебхука,
+# где несколько экземпляров бота могут стоять за балансировщиком
+FSM_CACHE = os.getenv("FSM_CACHE")
 
 if not DB_DSN:
     raise ValueError("Переменная DB_DSN не найдена в .env")
 
 
-async def check_deadlines(bot: Bot, db: Database):
-    logger.info("Фоновый таск запущен")
-    while True:
-        try:
-            projects = await db.get_projects_near_deadline()
-            for p in projects:
-                hours_left = (p["deadline"] - datetime.utcnow()).total_seconds() // 3600
-                try:
-                    await bot.send_message(
-                        p["creator_id"],
-                        f"⚠️ Проект «{p['title']}»: дедлайн через {int(hours_left)} ч."
-                    )
-                    await db.set_last_notification(p["id"], datetime.utcnow())
-                    logger.info("Уведомление отправлено project_id=%d, user_id=%d", p["id"], p["creator_id"])
-                except Exception as e:
-                    logger.error("Не удалось отправить user_id=%d: %s", p["creator_id"], e)
-        except Exception as e:
-            logger.error("Ошибка фонового таска: %s", e)
-        await asyncio.sleep(1800)
+# Сборка диспетчера с хранилищем FSM и роутером (sharded - апдейты разложены по процессам по chat_id)
+def build_dispatcher(db: Database, sharded: bool = False) -> Dispatcher:
+    # Кэши в памяти процесса (FSM, настройки и часовой пояс пользователей) не сверяются с БД -
+    # они включаются, только если все апдейты чата обрабатывает один процесс
+    cached = FSM_CACHE == "1" if FSM_CACHE else sharded or BOT_MODE != "webhook"
+    db.cached = cached
+    if FSM_STORAGE == "memory":
+        storage = MemoryStorage()
+    else:
+        storage = PostgresStorage(db, cached=cached)
+        storage.start()
+    dp = Dispatcher(storage=storage)
+
+    router.db = db
+    router.message.middleware(HandlerMetricsMiddleware())
+    router.callback_query.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(RateLimitMiddleware(sender))
+    if TRACING:
+        dp.update.outer_middleware(TracingMiddleware())
+        bot.session.middleware(ApiTracingMiddleware())
+
+    dp.include_router(router)
+    return dp
+
+
+# Запуск планировщика напоминаний: он работает только в процессе, захватившем лидерство,
+# остальные процессы ждут и забирают лидерство, если лидер упал
+def start_scheduler(db: Database) -> asyncio.Task:
+    async def start():
+        scheduler = ReminderScheduler(sender, db)
+        await scheduler.load()
+        db.scheduler = scheduler
+        await scheduler.run()
+
+    async def stop():
+        scheduler, db.scheduler = db.scheduler, None
+        if scheduler:
+            await scheduler.close()
+            logger.info("Планировщик напоминаний остановлен")
+
+    return asyncio.create_task(run_as_leader(LeaderLock(db.dsn), start, stop))
 
 
 async def main():
     db = Database(DB_DSN)
     await db.connect()
+    await db.warm_known_users()
 
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    dp = build_dispatcher(db)
 
-    router.db = db
+    sender.start()
 
-    dp.include_router(router)
+    leader = start_scheduler(db)
+    metrics_runner = await start_metrics_server()
 
-    logger.info(f"Запуск бота...")
-    asyncio.create_task(check_deadlines(bot, db))
+    logger.info("Запуск бота...")
     try:
-        await dp.start_polling(bot, skip_updates=True)
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot, skip_updates=True)
     except Exception as e:
-        logger.error(f"Критическая ошибка при polling: {e}")
+        logger.error("Критическая ошибка при получении апдейтов (%s): %s", BOT_MODE, e)
+    finally:
+        await dp.storage.close()
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        await sender.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 if __name__ == "__main__":
+    setup_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен вручную (Ctrl+C)")
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка: {e}")
+        logger.error("Непредвиденная ошибка: %s", e)
@@ -0,0 +1,70 @@
+import time
+from typing import Any, Awaitable, Callable
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject, Update
+from metrics import Counter, Histogram
+import tracing
+
+HANDLER_DURATION = Histogram("bot_handler_duration_seconds", "Время работы обработчика апдейта", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Необработанные исключения в обработчиках", ("handler",))
+
+# Методы Bot API, которые отправляют или меняют сообщения и попадают под лимит ~30 сообщений/сек
+RATE_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+# Замер времени каждого обработчика по имени функции (inner-middleware: срабатывает, когда
+# фильтры уже выбрали обработчик, поэтому в data есть "handler")
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        # Для кнопок обработчик выбирает CallbackDispatcher (callbacks.py), его и меряем
+        callback = data.get("callback_handler") or getattr(data.get("handler"), "callback", None)
+        name = getattr(callback, "__name__", "unknown")
+        start = time.perf_counter()
+        try:
+            with tracing.span("handler", name):
+                return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - start, handler=name)
+
+
+# Трасса на каждый апдейт (outer-middleware на dp.update, включается TRACING=1)
+class TracingMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        update_id = event.update_id if isinstance(event, Update) else None
+        return await tracing.trace_update(update_id, lambda: handler(event, data))
+
+
+# Span на каждый запрос к Bot API из обработчика (message.answer, edit_text и т.п.)
+class ApiTracingMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod):
+        with tracing.span("api", getattr(method, "__api_method__", type(method).__name__)):
+            return await make_request(bot, method)
+
+
+# Общий глобальный лимит Telegram для ответов обработчиков (message.answer, edit_text и т.п.):
+# они идут в Bot API напрямую, а не через очередь MessageSender, но забирают токены из того же bucket
+class RateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(self, sender):
+        self.sender = sender
+
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod):
+        if getattr(method, "__api_method__", "").startswith(RATE_LIMITED_PREFIXES):
+            await self.sender.throttle()
+        return await make_request(bot, method)
+
@@ -0,0 +1,79 @@
+import asyncio
+import asyncpg
+import logging
+import os
+import re
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# Ключ advisory lock'а: несколько процессов, стартующих одновременно, применяют миграции по очереди
+MIGRATIONS_LOCK_KEY = 815200102
+
+_FILENAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+# Миграции из каталога migrations/: файлы NNNN_название.sql, применяются по возрастанию номера
+def load_migrations(directory: str = MIGRATIONS_DIR) -> list[tuple[int, str, str]]:
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            migrations.append((int(match.group(1)), match.group(2), f.read()))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Повторяющиеся номера миграций в {directory}")
+    return migrations
+
+
+# Применить недостающие миграции (каждая - в своей транзакции, номер записывается в schema_migrations).
+# Выполняется на отдельном соединении до создания пула.
+async def migrate(dsn: str) -> list[int]:
+    conn = await asyncpg.connect(dsn)
+    applied_now = []
+    try:
+        await conn.execute("SELECT pg_advisory_lock($1);", MIGRATIONS_LOCK_KEY)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+            );
+        """)
+        applied = {r["version"] for r in await conn.fetch("SELECT version FROM schema_migrations;")}
+        for version, name, sql in load_migrations():
+            if version in applied:
+                continue
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2);", version, name
+                )
+            applied_now.append(version)
+            logger.info("Применена миграция %04d_%s", version, name)
+        if not applied_now:
+            logger.info("Схема БД актуальна (миграций: %d)", len(applied))
+        return applied_now
+
+    except Exception as e:
+        logger.error("Ошибка применения миграций: %s", e)
+        raise
+
+    finally:
+        await conn.close()
+
+
+# Ручной запуск: python migrate.py
+if __name__ == "__main__":
+    from logger import setup_logging
+    setup_logging()
+    dsn = os.getenv("DB_DSN")
+    if not dsn:
+        raise ValueError("Переменная DB_DSN не найдена в .env")
+    asyncio.run(migrate(dsn))
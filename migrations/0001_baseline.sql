@@ -0,0 +1,109 @@
+-- Базовая схема. Приводит к одному виду и пустую БД, и БД, созданную вручную по старому postgres.sql.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username VARCHAR(255),
+    full_name VARCHAR(255),
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+);
+
+-- У пользователя Telegram может не быть username, а занятый username может перейти к другому
+ALTER TABLE users ALTER COLUMN username DROP NOT NULL;
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_username_key;
+
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    title VARCHAR(200) NOT NULL,
+    creator_id BIGINT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    deadline TIMESTAMP WITHOUT TIME ZONE,
+    last_notification_sent TIMESTAMP WITH TIME ZONE
+);
+
+-- Старая схема: project_id без автоинкремента и первичного ключа (код везде использует projects.id)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'projects' AND column_name = 'project_id'
+    ) AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'projects' AND column_name = 'id'
+    ) THEN
+        ALTER TABLE projects RENAME COLUMN project_id TO id;
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'projects' AND column_name = 'id'
+            AND (is_identity = 'YES' OR column_default LIKE 'nextval(%')
+    ) THEN
+        ALTER TABLE projects ALTER COLUMN id SET NOT NULL;
+        ALTER TABLE projects ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+        PERFORM setval(pg_get_serial_sequence('projects', 'id'), COALESCE((SELECT MAX(id) FROM projects), 0) + 1, false);
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'projects'::regclass AND contype = 'p'
+    ) THEN
+        ALTER TABLE projects ADD PRIMARY KEY (id);
+    END IF;
+END $$;
+
+-- Дедлайн по умолчанию не установлен (раньше по умолчанию ставилось время создания)
+ALTER TABLE projects ALTER COLUMN deadline DROP DEFAULT;
+ALTER TABLE projects DROP COLUMN IF EXISTS next_notificaton;
+
+CREATE TABLE IF NOT EXISTS project_members (
+    project_id INTEGER NOT NULL,
+    user_id BIGINT NOT NULL,
+    joined_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (project_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS invites (
+    key VARCHAR PRIMARY KEY,
+    active BOOLEAN NOT NULL,
+    answer BOOLEAN NOT NULL
+);
+
+-- Старое имя таблицы настроек в postgres.sql - notification_settings, код работает с notifications_settings
+DO $$
+BEGIN
+    IF to_regclass('notification_settings') IS NOT NULL AND to_regclass('notifications_settings') IS NULL THEN
+        ALTER TABLE notification_settings RENAME TO notifications_settings;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS notifications_settings (
+    user_id BIGINT PRIMARY KEY,
+    enable_reminders BOOLEAN DEFAULT TRUE,
+    reminder_hours INTEGER[] DEFAULT '{24,6,1}'::integer[],
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Первичные ключи для таблиц, созданных без них (дубликаты удаляются: ON CONFLICT без ключа не работает)
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'project_members'::regclass AND contype = 'p') THEN
+        DELETE FROM project_members a
+        USING project_members b
+        WHERE a.project_id = b.project_id AND a.user_id = b.user_id AND a.ctid > b.ctid;
+        ALTER TABLE project_members ADD PRIMARY KEY (project_id, user_id);
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'invites'::regclass AND contype = 'p') THEN
+        DELETE FROM invites a
+        USING invites b
+        WHERE a.key = b.key AND a.ctid > b.ctid;
+        ALTER TABLE invites ADD PRIMARY KEY (key);
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'notifications_settings'::regclass AND contype = 'p') THEN
+        DELETE FROM notifications_settings a
+        USING notifications_settings b
+        WHERE a.user_id = b.user_id AND a.ctid > b.ctid;
+        ALTER TABLE notifications_settings ADD PRIMARY KEY (user_id);
+    END IF;
+END $$;
@@ -0,0 +1,24 @@
+-- Материализованное расписание напоминаний: одна строка на (проект, за сколько часов напомнить)
+CREATE TABLE IF NOT EXISTS reminder_schedule (
+    project_id INTEGER NOT NULL,
+    reminder_hour INTEGER NOT NULL,
+    fire_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    -- До какого момента напоминание захвачено экземпляром, который его отправляет
+    claimed_until TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (project_id, reminder_hour)
+);
+
+ALTER TABLE reminder_schedule ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP WITHOUT TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS reminder_schedule_fire_at_idx ON reminder_schedule (fire_at);
+
+-- Первичное заполнение расписания для уже существующих проектов
+INSERT INTO reminder_schedule (project_id, reminder_hour, fire_at)
+SELECT p.id, rh, p.deadline - (rh * INTERVAL '1 hour')
+FROM projects p
+JOIN notifications_settings ns ON p.creator_id = ns.user_id
+JOIN UNNEST(ns.reminder_hours) AS rh ON TRUE
+WHERE
+    ns.enable_reminders = TRUE
+    AND p.deadline - (rh * INTERVAL '1 hour') > NOW() AT TIME ZONE 'UTC'
+ON CONFLICT DO NOTHING;
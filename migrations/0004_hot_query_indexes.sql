@@ -0,0 +1,11 @@
+-- Индексы под частые запросы.
+-- Проекты пользователя и листание "Мои проекты" (creator_id = $1 AND id > $2 ORDER BY id)
+CREATE INDEX IF NOT EXISTS projects_creator_id_idx ON projects (creator_id, id);
+-- Поиск проектов по дедлайну (напоминания, очистка просроченного расписания)
+CREATE INDEX IF NOT EXISTS projects_deadline_idx ON projects (deadline);
+-- Проекты, в которых участвует пользователь (первичный ключ начинается с project_id)
+CREATE INDEX IF NOT EXISTS project_members_user_id_idx ON project_members (user_id);
+-- invites(key) покрыт первичным ключом, users(user_id) и notifications_settings(user_id) - тоже
+
+ANALYZE projects;
+ANALYZE project_members;
@@ -0,0 +1,4 @@
+-- Часовой пояс (имя IANA, NULL - DEFAULT_TIMEZONE) и язык пользователя (language_code из Telegram).
+-- Дедлайны в projects хранятся в UTC без пояса, в местное время переводятся при выводе.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone TEXT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS language_code TEXT;
@@ -0,0 +1,2 @@
+-- Режим сводки: все наступившие за цикл напоминания пользователя приходят одним сообщением
+ALTER TABLE notifications_settings ADD COLUMN IF NOT EXISTS digest BOOLEAN NOT NULL DEFAULT FALSE;
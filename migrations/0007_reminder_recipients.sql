@@ -0,0 +1,36 @@
+-- Расписание напоминаний по получателям: одна строка на (проект, получатель, за сколько часов напомнить).
+-- Получатели - создатель и участники проекта, у каждого свои интервалы и своё включение напоминаний.
+ALTER TABLE reminder_schedule ADD COLUMN IF NOT EXISTS user_id BIGINT;
+
+-- Имеющиеся строки строились по настройкам создателя - они и остаются за ним
+-- (наступившие, но ещё не отправленные напоминания не теряются)
+UPDATE reminder_schedule rs
+SET user_id = p.creator_id
+FROM projects p
+WHERE rs.project_id = p.id AND rs.user_id IS NULL;
+
+DELETE FROM reminder_schedule WHERE user_id IS NULL;
+
+ALTER TABLE reminder_schedule ALTER COLUMN user_id SET NOT NULL;
+ALTER TABLE reminder_schedule DROP CONSTRAINT IF EXISTS reminder_schedule_pkey;
+ALTER TABLE reminder_schedule ADD PRIMARY KEY (project_id, user_id, reminder_hour);
+
+-- Пересчёт расписания получателя после смены его настроек
+CREATE INDEX IF NOT EXISTS reminder_schedule_user_id_idx ON reminder_schedule (user_id, fire_at);
+-- Чтение захваченных на отправку строк
+CREATE INDEX IF NOT EXISTS reminder_schedule_claimed_until_idx ON reminder_schedule (claimed_until)
+WHERE claimed_until IS NOT NULL;
+
+-- Первичное заполнение расписания участников по их собственным настройкам
+INSERT INTO reminder_schedule (project_id, user_id, reminder_hour, fire_at)
+SELECT p.id, pm.user_id, rh, p.deadline - (rh * INTERVAL '1 hour')
+FROM projects p
+JOIN project_members pm ON pm.project_id = p.id
+JOIN notifications_settings ns ON pm.user_id = ns.user_id
+JOIN UNNEST(ns.reminder_hours) AS rh ON TRUE
+WHERE
+    ns.enable_reminders = TRUE
+    AND p.deadline - (rh * INTERVAL '1 hour') > NOW() AT TIME ZONE 'UTC'
+ON CONFLICT DO NOTHING;
+
+ANALYZE reminder_schedule;
@@ -0,0 +1,344 @@
+import asyncio
+import asyncpg
+import heapq
+import itertools
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from aiogram.exceptions import TelegramForbiddenError
+from dotenv import load_dotenv
+from db import Database, REMINDER_SCHEDULE_CHANNEL
+from metrics import Counter
+from keyboards import get_digest_kb
+from sender import MessageSender
+from templates import render_digest, render_reminders
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Максимальный сон планировщика между проверками (сек); не реже этого выполняется и захват из БД,
+# даже если в памяти ничего не наступило (после ошибки захвата, пропущенного уведомления и т.п.)
+SCHEDULER_MAX_SLEEP = float(os.getenv("SCHEDULER_MAX_SLEEP", "300"))
+# Горизонт, на который расписание из reminder_schedule держится в памяти (сек)
+SCHEDULER_HORIZON = float(os.getenv("SCHEDULER_HORIZON", "86400"))
+# Пороги сброса отметок об отправке в БД: размер пачки и интервал (сек)
+SCHEDULER_FLUSH_SIZE = int(os.getenv("SCHEDULER_FLUSH_SIZE", "500"))
+SCHEDULER_FLUSH_INTERVAL = float(os.getenv("SCHEDULER_FLUSH_INTERVAL", "2"))
+# На сколько секунд напоминание захватывается на отправку; неотправленное повторяется по истечении
+SCHEDULER_CLAIM_LEASE = float(os.getenv("SCHEDULER_CLAIM_LEASE", "300"))
+# Сколько проектов максимум в одной сводке напоминаний (лимит текста сообщения - 4096 символов)
+SCHEDULER_DIGEST_SIZE = int(os.getenv("SCHEDULER_DIGEST_SIZE", "30"))
+# Окно сводки (сек): когда у пользователя в режиме сводки наступает напоминание, в ту же сводку
+# забираются его напоминания, наступающие в ближайшие SCHEDULER_DIGEST_WINDOW сек (0 - без окна)
+SCHEDULER_DIGEST_WINDOW = float(os.getenv("SCHEDULER_DIGEST_WINDOW", "3600"))
+# Размер порции захваченных напоминаний, читаемой из курсора при рассылке
+SCHEDULER_FANOUT_BATCH = int(os.getenv("SCHEDULER_FANOUT_BATCH", "1000"))
+# Как часто проверять соединение подписки на изменения расписания и переподключаться после обрыва (сек)
+SCHEDULER_LISTEN_CHECK = float(os.getenv("SCHEDULER_LISTEN_CHECK", "30"))
+
+REMINDERS_SENT = Counter("reminders_sent_total", "Отправленные напоминания о дедлайнах")
+REMINDERS_FAILED = Counter("reminders_failed_total", "Неудачные отправки напоминаний о дедлайнах")
+DIGESTS_SENT = Counter("reminder_digests_sent_total", "Отправленные сводки напоминаний (несколько проектов в сообщении)")
+
+
+# Планировщик напоминаний о дедлайнах.
+# Источник истины - таблица reminder_schedule, в памяти лежит только min-heap
+# (fire_at, seq, project_id, reminder_hour) на горизонт SCHEDULER_HORIZON, чтобы спать до ближайшего срока.
+# Устаревшие записи не удаляются из кучи, а пропускаются: у каждого проекта есть текущая "версия",
+# и запись действительна, только если её версия совпадает с текущей.
+class ReminderScheduler:
+    def __init__(self, sender: MessageSender, db: Database):
+        self.sender = sender
+        self.db = db
+        self._heap = []
+        self._versions = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._horizon_end = datetime.utcnow()
+        # Когда захватить наступившие напоминания из БД, даже если в куче ничего не наступило
+        self._next_claim = datetime.utcnow()
+        # Отправленные, но ещё не записанные в БД напоминания: (project_id, user_id, ts, fire_at)
+        self._sent = []
+        # (project_id, user_id), по которым отправка в процессе или отметка ещё не сброшена - не отправляем повторно
+        self._inflight = set()
+        self._flush_lock = asyncio.Lock()
+        self._tasks = set()
+        self._listener = None
+        self._listen_task = None
+        self._flusher = None
+
+
+# Загрузка расписания (при старте и по истечении горизонта)
+    async def load(self):
+        now = datetime.utcnow()
+        self._horizon_end = now + timedelta(seconds=SCHEDULER_HORIZON)
+        rows = await self.db.get_reminder_schedule(since=now, until=self._horizon_end)
+        self._heap.clear()
+        self._versions.clear()
+        self._push_rows(rows)
+        logger.info("Планировщик загружен, напоминаний в очереди: %d", len(self._heap))
+
+
+    def _push_rows(self, rows):
+        rows = [r for r in rows if r["fire_at"] <= self._horizon_end]
+        for project_id in {r["project_id"] for r in rows}:
+            self._versions[project_id] = next(self._seq)
+        for r in rows:
+            version = self._versions[r["project_id"]]
+            heapq.heappush(self._heap, (r["fire_at"], version, r["project_id"], r["reminder_hour"]))
+        if rows:
+            self._wakeup.set()
+
+
+    def _is_valid(self, entry) -> bool:
+        _, version, project_id, _ = entry
+        return self._versions.get(project_id) == version
+
+
+# Обновить напоминания проектов после пересчёта reminder_schedule
+    def update_projects(self, project_ids, rows):
+        for project_id in project_ids:
+            self._versions.pop(project_id, None)
+        self._push_rows(rows)
+        logger.debug("Напоминания обновлены: проектов %d, записей %d", len(project_ids), len(rows))
+
+
+# Подписка на изменения расписания из других процессов (LISTEN reminder_schedule)
+    async def listen(self):
+        self._listener = await asyncpg.connect(self.db.dsn)
+        await self._listener.add_listener(REMINDER_SCHEDULE_CHANNEL, self._on_notify)
+        logger.info("Планировщик подписан на изменения расписания")
+
+
+# Держать подписку: соединение проверяется раз в SCHEDULER_LISTEN_CHECK сек, после обрыва (или неудачной
+# первой подписки) - переподключение и полная перезагрузка расписания, ведь уведомления без подписки потеряны
+    async def _keep_listening(self):
+        lost = False
+        while True:
+            try:
+                if self._listener is None:
+                    await self.listen()
+                    if lost:
+                        await self.load()
+                        self._wakeup.set()
+                    lost = False
+                await asyncio.sleep(SCHEDULER_LISTEN_CHECK)
+                await asyncio.wait_for(self._listener.fetchval("SELECT 1;"), timeout=SCHEDULER_LISTEN_CHECK)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Подписка на изменения расписания потеряна: %s", e)
+                lost = True
+                await self._close_listener()
+                await asyncio.sleep(min(SCHEDULER_LISTEN_CHECK, 5))
+
+
+    async def _close_listener(self):
+        if self._listener is not None:
+            try:
+                await self._listener.close(timeout=1)
+            except Exception:
+                self._listener.terminate()
+            self._listener = None
+
+
+    def _on_notify(self, conn, pid, channel, payload):
+        project_ids = [int(x) for x in payload.split(",") if x]
+        task = asyncio.create_task(self._reload_projects(project_ids))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+    async def _reload_projects(self, project_ids: list[int]):
+        try:
+            rows = await self.db.get_project_reminders(project_ids)
+            self.update_projects(project_ids, rows)
+        except Exception as e:
+            logger.error("Ошибка обновления напоминаний по уведомлению: %s", e)
+
+
+# Удалить напоминания проекта
+    def remove_project(self, project_id: int):
+        self._versions.pop(project_id, None)
+
+
+    def _next_delay(self) -> float:
+        while self._heap and not self._is_valid(self._heap[0]):
+            heapq.heappop(self._heap)
+        now = datetime.utcnow()
+        delay = min(SCHEDULER_MAX_SLEEP, (self._horizon_end - now).total_seconds(), (self._next_claim - now).total_seconds())
+        if self._heap:
+            delay = min(delay, (self._heap[0][0] - now).total_seconds())
+        return max(delay, 0)
+
+
+    def _pop_due(self, now: datetime) -> bool:
+        due = False
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            due = due or self._is_valid(entry)
+        return due
+
+
+# Отправка наступивших напоминаний (несколько наступивших часов одного проекта -> одно сообщение).
+# Расписание строится на каждого получателя (создатель и участники проекта) по его собственным настройкам,
+# поэтому захватываются строки (проект, получатель); они читаются порциями, тексты отрисовываются от одного
+# момента now, в часовом поясе и на языке получателя; в режиме сводки несколько проектов -> одно сообщение
+# (и напоминания получателя из окна SCHEDULER_DIGEST_WINDOW приходят в ней заранее).
+    async def _fire_due(self, force: bool = False):
+        now = datetime.utcnow()
+        if now >= self._horizon_end:
+            await self.load()
+            force = True
+        if not self._pop_due(now) and not force and now < self._next_claim:
+            return
+        self._next_claim = now + timedelta(seconds=SCHEDULER_MAX_SLEEP)
+        claimed_until = now + timedelta(seconds=SCHEDULER_CLAIM_LEASE)
+        try:
+            claimed = await self.db.claim_due_reminders(now, claimed_until, SCHEDULER_DIGEST_WINDOW)
+        except Exception:
+            # Наступившие записи уже сняты с кучи, но в БД остались - повторить захват на следующем круге
+            self._next_claim = now
+            raise
+        if claimed:
+            await self._fan_out(claimed_until, now)
+
+
+# Рассылка захваченных напоминаний из курсора. Строки идут по получателю, поэтому его последняя группа
+# в порции переносится в следующую: сводка получателя не разрывается между порциями.
+    async def _fan_out(self, claimed_until: datetime, now: datetime):
+        carry = []
+        try:
+            async for rows in self.db.iter_claimed_reminders(claimed_until, now, SCHEDULER_FANOUT_BATCH):
+                rows = carry + [r for r in rows if (r["id"], r["user_id"]) not in self._inflight]
+                cut = len(rows)
+                while cut and rows[cut - 1]["user_id"] == rows[-1]["user_id"]:
+                    cut -= 1
+                carry = rows[cut:]
+                self._submit(rows[:cut], now, claimed_until)
+            self._submit(carry, now, claimed_until)
+        except Exception:
+            # Непрочитанные строки остаются захваченными до claimed_until
+            self._retry_later(claimed_until)
+            raise
+
+
+    def _submit(self, rows, now: datetime, claimed_until: datetime):
+        for group, text, kwargs in self._messages(rows, now):
+            self._inflight.update((r["id"], r["user_id"]) for r in group)
+            future = self.sender.submit(group[0]["user_id"], text, **kwargs)
+            future.add_done_callback(lambda f, group=group: self._on_sent(f, group, now, claimed_until))
+
+
+# Сообщения порции: (строки, текст, параметры отправки). Получателю в режиме сводки с двумя
+# и более напоминаниями уходит сводка с кнопками в проекты, остальным - по сообщению на проект.
+    def _messages(self, rows, now: datetime):
+        singles, digests = [], defaultdict(list)
+        for r in rows:
+            if r["digest"]:
+                digests[r["user_id"]].append(r)
+            else:
+                singles.append(r)
+        for group in digests.values():
+            if len(group) == 1:
+                singles.append(group[0])
+                continue
+            for i in range(0, len(group), SCHEDULER_DIGEST_SIZE):
+                chunk = group[i:i + SCHEDULER_DIGEST_SIZE]
+                markup = get_digest_kb([r["id"] for r in chunk])
+                yield chunk, render_digest(chunk, now), {"reply_markup": markup}
+        for r, text in zip(singles, render_reminders(singles, now)):
+            yield [r], text, {}
+
+
+# Итог отправки сообщения получателю: доставленное (и недоставляемое - бот заблокирован) снимается
+# с расписания, остальное повторяется после истечения захвата - только для этого получателя
+    def _on_sent(self, future: asyncio.Future, group: list, ts: datetime, claimed_until: datetime):
+        user_id = group[0]["user_id"]
+        error = future.exception() if not future.cancelled() else asyncio.CancelledError()
+        if error is None:
+            REMINDERS_SENT.inc(len(group))
+            if len(group) > 1:
+                DIGESTS_SENT.inc()
+            logger.info("Уведомление отправлено user_id=%d, проекты: %s", user_id, ", ".join(str(r["id"]) for r in group))
+        else:
+            REMINDERS_FAILED.inc(len(group))
+            logger.error("Не удалось отправить user_id=%d: %s", user_id, error if not future.cancelled() else "отменено")
+        if error is None or isinstance(error, TelegramForbiddenError):
+            self._sent.extend((r["id"], user_id, ts, r["fire_at"]) for r in group)
+            if len(self._sent) >= SCHEDULER_FLUSH_SIZE:
+                task = asyncio.create_task(self.flush())
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        else:
+            self._inflight.difference_update((r["id"], user_id) for r in group)
+            self._retry_later(claimed_until)
+
+
+# Повторить захват, когда истечёт захват неотправленных напоминаний в БД
+    def _retry_later(self, at: datetime):
+        if at < self._next_claim:
+            self._next_claim = at
+            self._wakeup.set()
+
+
+# Записать в БД пачку отправленных напоминаний
+    async def flush(self):
+        async with self._flush_lock:
+            batch, self._sent = self._sent, []
+            if not batch:
+                return
+            try:
+                await self.db.set_last_notifications_many(batch)
+            except Exception as e:
+                logger.error("Ошибка сброса отметок об отправке (%d шт.): %s", len(batch), e)
+                self._sent = batch + self._sent
+                return
+            self._inflight.difference_update((project_id, user_id) for project_id, user_id, _, _ in batch)
+
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(SCHEDULER_FLUSH_INTERVAL)
+            await self.flush()
+
+
+# Остановка: отписка от изменений расписания и сброс накопленных отметок об отправке
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            await asyncio.gather(self._listen_task, return_exceptions=True)
+            self._listen_task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._close_listener()
+        await self.flush()
+
+
+# Основной цикл
+    async def run(self):
+        logger.info("Планировщик напоминаний запущен")
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        self._listen_task = asyncio.create_task(self._keep_listening())
+        # Напоминания, наступившие пока бот был выключен
+        try:
+            await self._fire_due(force=True)
+        except Exception as e:
+            logger.error("Ошибка планировщика напоминаний: %s", e)
+        while True:
+            try:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._next_delay())
+                except asyncio.TimeoutError:
+                    pass
+                await self._fire_due()
+            except Exception as e:
+                logger.error("Ошибка планировщика напоминаний: %s", e)
+                await asyncio.sleep(1)
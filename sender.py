@@ -0,0 +1,308 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from contextvars import ContextVar
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from dotenv import load_dotenv
+from bot import bot
+from metrics import Counter, Gauge, Histogram
+import tracing
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+SENDER_WORKERS = int(os.getenv("SENDER_WORKERS", "16"))
+# Лимиты Telegram: ~30 сообщений/сек на бота и ~1 сообщение/сек в один чат
+SENDER_GLOBAL_RATE = float(os.getenv("SENDER_GLOBAL_RATE", "30"))
+SENDER_CHAT_RATE = float(os.getenv("SENDER_CHAT_RATE", "1"))
+SENDER_CHAT_BURST = float(os.getenv("SENDER_CHAT_BURST", "3"))
+
+MESSAGES_SENT = Counter("bot_messages_sent_total", "Отправленные сообщения")
+MESSAGES_FAILED = Counter("bot_messages_failed_total", "Неудачные отправки сообщений", ("error",))
+MESSAGES_FLOOD_WAIT = Counter("bot_messages_flood_wait_total", "Отправки, отложенные из-за flood wait")
+API_DURATION = Histogram("telegram_api_duration_seconds", "Время запроса к Bot API", ("method",))
+DELIVERY_LATENCY = Histogram("bot_message_delivery_seconds", "Время от постановки в очередь до отправки")
+QUEUE_DEPTH = Gauge("bot_sender_queue_depth", "Сообщения в очереди на отправку")
+
+# Приоритеты очереди: ответы пользователю (приглашения и т.п.) обгоняют волну напоминаний
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Запрос к Bot API идёт из воркера отправки, который уже забрал токен глобального лимита
+_reserved: ContextVar[bool] = ContextVar("sender_reserved", default=False)
+
+
+# Token bucket: reserve() забирает токен (баланс может уйти в минус) и возвращает, сколько ждать
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+# Token bucket в разделяемой памяти процессов (multiprocessing.Array("d", [capacity, time.monotonic()])):
+# один глобальный лимит на все воркеры launcher.py, кто бы из них ни отправлял
+class SharedTokenBucket(TokenBucket):
+    def __init__(self, rate: float, capacity: float, state):
+        self.rate = rate
+        self.capacity = capacity
+        self._state = state
+
+
+    @property
+    def tokens(self) -> float:
+        return self._state[0]
+
+
+    @tokens.setter
+    def tokens(self, value: float):
+        self._state[0] = value
+
+
+    @property
+    def updated(self) -> float:
+        return self._state[1]
+
+
+    @updated.setter
+    def updated(self, value: float):
+        self._state[1] = value
+
+
+    def reserve(self) -> float:
+        with self._state.get_lock():
+            return super().reserve()
+
+
+    def wait_time(self) -> float:
+        with self._state.get_lock():
+            return super().wait_time()
+
+
+    def idle(self) -> bool:
+        with self._state.get_lock():
+            return super().idle()
+
+
+# Задание на отправку
+class _Job:
+    __slots__ = ("chat_id", "text", "kwargs", "future", "priority", "enqueued_at", "trace")
+
+    def __init__(self, chat_id: int, text: str, kwargs: dict, future: asyncio.Future, priority: int):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.future = future
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        # Трасса апдейта, из которого поставлено сообщение (отправка идёт в задаче воркера)
+        self.trace = tracing.current()
+
+
+# Исходящий диспетчер сообщений: очередь с приоритетами + пул воркеров с глобальным и per-chat лимитами.
+# RetryAfter (flood wait) не считается ошибкой: задание возвращается в очередь через retry_after секунд.
+# Глобальный лимит общий с ответами обработчиков (message.answer и т.п.), см. throttle().
+class MessageSender:
+    def __init__(
+        self,
+        bot: Bot,
+        workers: int = SENDER_WORKERS,
+        global_rate: float = SENDER_GLOBAL_RATE,
+        chat_rate: float = SENDER_CHAT_RATE,
+        chat_burst: float = SENDER_CHAT_BURST
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        # (приоритет, порядковый номер, задание): внутри приоритета - FIFO
+        self.queue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._tasks = []
+        self._delayed = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+
+# Глобальный лимит, общий для нескольких процессов (state - см. SharedTokenBucket)
+    def share_global_bucket(self, state):
+        rate = self._global_bucket.rate
+        self._global_bucket = SharedTokenBucket(rate, rate, state)
+
+
+# Запуск воркеров
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._prune_buckets()))
+        QUEUE_DEPTH.set_function(lambda: self.queue.qsize() + self._delayed)
+        logger.info("Диспетчер сообщений запущен, воркеров: %d", self.workers)
+
+
+# Остановка воркеров
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Поставить сообщение в очередь (результат - future с отправленным Message).
+# По умолчанию - массовая рассылка; сообщения, которых ждёт пользователь, ставятся с PRIORITY_INTERACTIVE.
+    def submit(self, chat_id: int, text: str, priority: int = PRIORITY_BULK, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(self._retrieve)
+        self._put(_Job(chat_id, text, kwargs, future, priority))
+        return future
+
+
+# Отправить сообщение из обработчика и дождаться результата (вне очереди рассылок)
+    async def send(self, chat_id: int, text: str, **kwargs):
+        return await self.submit(chat_id, text, priority=PRIORITY_INTERACTIVE, **kwargs)
+
+
+# Дождаться токена глобального лимита для запроса к Bot API в обход очереди (ответы обработчиков)
+    async def throttle(self):
+        if _reserved.get():
+            return
+        delay = self._global_bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Текущее состояние очереди и задержки отправки
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize() + self._delayed,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "latency_avg": self.latency_total / self.sent if self.sent else 0.0,
+            "latency_max": self.latency_max
+        }
+
+
+    @staticmethod
+    def _retrieve(future: asyncio.Future):
+        if not future.cancelled():
+            future.exception()
+
+
+    def _put(self, job: _Job):
+        self.queue.put_nowait((job.priority, next(self._order), job))
+
+
+    def _requeue_later(self, job: _Job, delay: float):
+        self._delayed += 1
+
+        def _put():
+            self._delayed -= 1
+            self._put(job)
+
+        asyncio.get_running_loop().call_later(delay, _put)
+
+
+    async def _worker(self, number: int):
+        # Токен глобального лимита воркер берёт сам в _process
+        _reserved.set(True)
+        while True:
+            _, _, job = await self.queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.error("Ошибка воркера отправки №%d: %s", number, e)
+            finally:
+                self.queue.task_done()
+
+
+    async def _process(self, job: _Job):
+        if job.future.done():
+            return
+
+        bucket = self._chat_buckets.get(job.chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[job.chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        delay = bucket.wait_time()
+        if delay > 0:
+            # Чат упёрся в свой лимит - не держим воркер, отложим задание
+            self._requeue_later(job, delay)
+            return
+        bucket.reserve()
+
+        delay = self._global_bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        try:
+            tracing.record("sender", "ожидание в очереди", time.monotonic() - job.enqueued_at, job.trace)
+            with API_DURATION.time(method="sendMessage"), tracing.span("api", "sendMessage", job.trace):
+                message = await self.bot.send_message(job.chat_id, job.text, **job.kwargs)
+        except TelegramRetryAfter as e:
+            self.retried += 1
+            MESSAGES_FLOOD_WAIT.inc()
+            logger.warning("Flood wait для chat_id=%d: повтор через %s сек", job.chat_id, e.retry_after)
+            self._requeue_later(job, e.retry_after)
+            return
+        except Exception as e:
+            self.failed += 1
+            MESSAGES_FAILED.inc(error=type(e).__name__)
+            logger.error("Не удалось отправить сообщение chat_id=%d: %s", job.chat_id, e)
+            job.future.set_exception(e)
+            return
+
+        latency = time.monotonic() - job.enqueued_at
+        self.sent += 1
+        MESSAGES_SENT.inc()
+        DELIVERY_LATENCY.observe(latency)
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        job.future.set_result(message)
+
+
+# Периодическая очистка простаивающих per-chat bucket'ов (память не растёт с числом чатов)
+    async def _prune_buckets(self):
+        while True:
+            await asyncio.sleep(60)
+            for chat_id in [c for c, b in self._chat_buckets.items() if b.idle()]:
+                del self._chat_buckets[chat_id]
+
+
+sender = MessageSender(bot)
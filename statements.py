@@ -0,0 +1,341 @@
+# Реестр именованных SQL-запросов.
+# Методы Database вызывают запросы по имени; на каждом соединении пула запрос готовится (PREPARE)
+# при первом вызове и дальше берётся из кэша запросов asyncpg, без повторного разбора и планирования.
+STATEMENTS = {
+    "user_exists": """
+        SELECT 1 FROM users
+        WHERE user_id = $1;
+    """,
+
+    "register_user": """
+        INSERT INTO users (user_id, username, full_name, language_code)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (user_id) DO UPDATE
+        SET language_code = COALESCE(EXCLUDED.language_code, users.language_code)
+        WHERE users.language_code IS DISTINCT FROM COALESCE(EXCLUDED.language_code, users.language_code);
+    """,
+
+    "get_user_locale": """
+        SELECT timezone, language_code FROM users WHERE user_id = $1;
+    """,
+
+    "set_user_timezone": """
+        UPDATE users SET timezone = $2 WHERE user_id = $1 RETURNING user_id;
+    """,
+
+    "get_recent_users": """
+        SELECT user_id, language_code FROM users
+        ORDER BY created_at DESC
+        LIMIT $1;
+    """,
+
+    "create_project": """
+        INSERT INTO projects (title, creator_id, created_at)
+        VALUES ($1, $2, NOW())
+        RETURNING id;
+    """,
+
+    "get_user_projects": """
+        SELECT id, title, deadline FROM projects
+        WHERE creator_id = $1;
+    """,
+
+    "get_user_projects_after": """
+        SELECT id, title, deadline FROM projects
+        WHERE creator_id = $1 AND id > $2
+        ORDER BY id
+        LIMIT $3;
+    """,
+
+    "get_user_projects_before": """
+        SELECT id, title, deadline FROM projects
+        WHERE creator_id = $1 AND id < $2
+        ORDER BY id DESC
+        LIMIT $3;
+    """,
+
+    "get_user_project": """
+        SELECT id, title, deadline, creator_id FROM projects p
+        WHERE
+            id = $1
+            AND (
+                creator_id = $2
+                OR EXISTS (SELECT 1 FROM project_members pm WHERE pm.project_id = p.id AND pm.user_id = $2)
+            );
+    """,
+
+    "delete_project": """
+        WITH deleted AS (
+            DELETE FROM projects
+            WHERE id = $1 AND creator_id = $2
+            RETURNING id
+        ), members AS (
+            DELETE FROM project_members
+            WHERE project_id IN (SELECT id FROM deleted)
+        ), schedule AS (
+            DELETE FROM reminder_schedule
+            WHERE project_id IN (SELECT id FROM deleted)
+        )
+        SELECT id FROM deleted;
+    """,
+
+    "add_member": """
+        WITH project AS (
+            SELECT id FROM projects
+            WHERE id = $1 AND creator_id = $3
+            FOR KEY SHARE
+        ), target AS (
+            SELECT user_id FROM users
+            WHERE user_id = $2
+        ), inserted AS (
+            INSERT INTO project_members (project_id, user_id)
+            SELECT project.id, target.user_id FROM project, target
+            ON CONFLICT DO NOTHING
+        )
+        SELECT
+            EXISTS (SELECT 1 FROM project) AS project_ok,
+            EXISTS (SELECT 1 FROM target) AS user_ok;
+    """,
+
+    "set_deadline": """
+        UPDATE projects SET deadline = $1
+        WHERE id = $2 AND creator_id = $3
+        RETURNING id;
+    """,
+
+    "get_notification_settings": """
+        SELECT enable_reminders, reminder_hours, digest FROM notifications_settings
+        WHERE user_id = $1;
+    """,
+
+    "update_notification_settings": """
+        INSERT INTO notifications_settings (user_id, enable_reminders, reminder_hours, digest)
+        VALUES ($1, $2, $3, COALESCE($4, FALSE))
+        ON CONFLICT (user_id) DO UPDATE
+        SET
+            enable_reminders = CASE
+                WHEN $2 IS NULL THEN notifications_settings.enable_reminders
+                ELSE $2
+            END,
+            reminder_hours = CASE
+                WHEN $3 IS NULL THEN notifications_settings.reminder_hours
+                ELSE $3
+            END,
+            digest = CASE
+                WHEN $4 IS NULL THEN notifications_settings.digest
+                ELSE $4
+            END
+        RETURNING enable_reminders, reminder_hours, digest;
+    """,
+
+    "toggle_reminder_hour": """
+        INSERT INTO notifications_settings (user_id, enable_reminders, reminder_hours, digest)
+        VALUES ($1, TRUE, ARRAY[$2::integer], FALSE)
+        ON CONFLICT (user_id) DO UPDATE
+        SET
+            enable_reminders = TRUE,
+            reminder_hours = CASE
+                WHEN NOT $2 = ANY(COALESCE(notifications_settings.reminder_hours, '{}'))
+                    THEN array_append(COALESCE(notifications_settings.reminder_hours, '{}'), $2)
+                WHEN cardinality(notifications_settings.reminder_hours) > 1
+                    THEN array_remove(notifications_settings.reminder_hours, $2)
+                ELSE notifications_settings.reminder_hours
+            END
+        RETURNING enable_reminders, reminder_hours, digest;
+    """,
+
+    "toggle_digest": """
+        INSERT INTO notifications_settings (user_id, enable_reminders, reminder_hours, digest)
+        VALUES ($1, NULL, NULL, TRUE)
+        ON CONFLICT (user_id) DO UPDATE
+        SET digest = NOT notifications_settings.digest
+        RETURNING enable_reminders, reminder_hours, digest;
+    """,
+
+    "delete_reminder_schedule": """
+        DELETE FROM reminder_schedule rs
+        WHERE
+            ($1::integer[] IS NULL OR rs.project_id = ANY($1::integer[]))
+            AND ($2::bigint IS NULL OR rs.user_id = $2)
+        RETURNING rs.project_id;
+    """,
+
+    "insert_reminder_schedule": """
+        INSERT INTO reminder_schedule (project_id, user_id, reminder_hour, fire_at)
+        SELECT
+            p.id,
+            r.user_id,
+            rh,
+            p.deadline - (rh * INTERVAL '1 hour')
+        FROM projects p
+        JOIN LATERAL (
+            SELECT p.creator_id AS user_id
+            UNION
+            SELECT pm.user_id FROM project_members pm WHERE pm.project_id = p.id
+        ) r ON TRUE
+        JOIN notifications_settings ns ON r.user_id = ns.user_id
+        JOIN UNNEST(ns.reminder_hours) AS rh ON TRUE
+        WHERE
+            ns.enable_reminders = TRUE
+            AND p.deadline - (rh * INTERVAL '1 hour') > $3
+            AND (
+                p.last_notification_sent IS NULL
+                OR p.last_notification_sent AT TIME ZONE 'UTC' < p.deadline - (rh * INTERVAL '1 hour')
+            )
+            AND ($1::integer[] IS NULL OR p.id = ANY($1::integer[]))
+            AND ($2::bigint IS NULL OR r.user_id = $2)
+        ON CONFLICT (project_id, user_id, reminder_hour) DO UPDATE SET fire_at = EXCLUDED.fire_at, claimed_until = NULL
+        RETURNING project_id, reminder_hour, fire_at;
+    """,
+
+    "get_reminder_schedule": """
+        SELECT project_id, reminder_hour, fire_at
+        FROM reminder_schedule
+        WHERE fire_at > $1
+        AND ($2::timestamp IS NULL OR fire_at <= $2);
+    """,
+
+    "get_project_reminders": """
+        SELECT project_id, reminder_hour, fire_at
+        FROM reminder_schedule
+        WHERE project_id = ANY($1::integer[]);
+    """,
+
+    "notify_reminder_schedule": """
+        SELECT pg_notify('reminder_schedule', $1);
+    """,
+
+    "purge_expired_reminders": """
+        DELETE FROM reminder_schedule rs
+        USING projects p
+        WHERE rs.project_id = p.id AND rs.fire_at <= $1 AND p.deadline <= $1;
+    """,
+
+    "claim_due_reminders": """
+        WITH due AS (
+            SELECT rs.project_id, rs.user_id, rs.reminder_hour
+            FROM reminder_schedule rs
+            LEFT JOIN notifications_settings ns ON ns.user_id = rs.user_id
+            WHERE
+                rs.fire_at <= $1::timestamp + $3::double precision * INTERVAL '1 second'
+                AND (rs.claimed_until IS NULL OR rs.claimed_until <= $1)
+                AND (
+                    rs.fire_at <= $1
+                    OR ns.digest AND EXISTS (
+                        SELECT 1 FROM reminder_schedule d
+                        WHERE
+                            d.user_id = rs.user_id
+                            AND d.fire_at <= $1
+                            AND (d.claimed_until IS NULL OR d.claimed_until <= $1)
+                    )
+                )
+            FOR UPDATE OF rs SKIP LOCKED
+        ), claimed AS (
+            UPDATE reminder_schedule rs
+            SET claimed_until = $2
+            FROM due
+            WHERE
+                rs.project_id = due.project_id
+                AND rs.user_id = due.user_id
+                AND rs.reminder_hour = due.reminder_hour
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM claimed;
+    """,
+
+    "get_claimed_reminders": """
+        SELECT
+            rs.user_id, p.id, p.title, p.deadline, MAX(rs.fire_at) AS fire_at,
+            u.timezone, u.language_code, COALESCE(ns.digest, FALSE) AS digest
+        FROM reminder_schedule rs
+        JOIN projects p ON p.id = rs.project_id
+        LEFT JOIN notifications_settings ns ON ns.user_id = rs.user_id
+        LEFT JOIN users u ON u.user_id = rs.user_id
+        WHERE rs.claimed_until = $1 AND p.deadline > $2
+        GROUP BY rs.user_id, p.id, p.title, p.deadline, u.timezone, u.language_code, ns.digest
+        ORDER BY rs.user_id, p.deadline;
+    """,
+
+    "set_last_notifications": """
+        WITH sent AS (
+            SELECT project_id, user_id, ts, fire_at
+            FROM UNNEST($1::integer[], $2::bigint[], $3::timestamp[], $4::timestamp[]) AS t(project_id, user_id, ts, fire_at)
+        ), cleared AS (
+            DELETE FROM reminder_schedule rs
+            USING sent
+            WHERE rs.project_id = sent.project_id AND rs.user_id = sent.user_id AND rs.fire_at <= sent.fire_at
+        )
+        UPDATE projects p
+        SET last_notification_sent = s.ts AT TIME ZONE 'UTC'
+        FROM (SELECT project_id, MAX(ts) AS ts FROM sent GROUP BY project_id) s
+        WHERE p.id = s.project_id;
+    """,
+
+    "set_unikey": """
+        INSERT INTO invites (key, active, answer)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (key) DO UPDATE
+        SET active = $2, answer = $3;
+    """,
+
+    "get_active_unikey": """
+        SELECT active, answer FROM invites
+        WHERE key = $1
+        AND active = True;
+    """,
+
+    "fsm_get": """
+        SELECT state, data::text AS data FROM fsm_storage
+        WHERE key = $1;
+    """,
+
+    "fsm_upsert": """
+        INSERT INTO fsm_storage (key, state, data, updated_at)
+        SELECT key, state, data::jsonb, NOW()
+        FROM UNNEST($1::text[], $2::text[], $3::text[]) AS t(key, state, data)
+        ON CONFLICT (key) DO UPDATE
+        SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = EXCLUDED.updated_at;
+    """,
+
+    "fsm_set_state": """
+        INSERT INTO fsm_storage (key, state, updated_at)
+        VALUES ($1, $2, NOW())
+        ON CONFLICT (key) DO UPDATE
+        SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at;
+    """,
+
+    "fsm_set_data": """
+        INSERT INTO fsm_storage (key, data, updated_at)
+        VALUES ($1, $2::jsonb, NOW())
+        ON CONFLICT (key) DO UPDATE
+        SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at;
+    """,
+
+    "fsm_clear_state": """
+        WITH deleted AS (
+            DELETE FROM fsm_storage
+            WHERE key = $1 AND data = '{}'::jsonb
+        )
+        UPDATE fsm_storage SET state = NULL, updated_at = NOW()
+        WHERE key = $1 AND data <> '{}'::jsonb;
+    """,
+
+    "fsm_clear_data": """
+        WITH deleted AS (
+            DELETE FROM fsm_storage
+            WHERE key = $1 AND state IS NULL
+        )
+        UPDATE fsm_storage SET data = '{}'::jsonb, updated_at = NOW()
+        WHERE key = $1 AND state IS NOT NULL;
+    """,
+
+    "fsm_delete": """
+        DELETE FROM fsm_storage
+        WHERE key = ANY($1::text[]);
+    """,
+
+    "fsm_purge": """
+        DELETE FROM fsm_storage
+        WHERE updated_at < NOW() - $1::double precision * INTERVAL '1 second';
+    """,
+}
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from dotenv import load_dotenv
+from db import Database
+import tracing
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Как часто сбрасывать изменённые состояния в БД (сек)
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))
+# Сколько держать неиспользуемое состояние в памяти процесса (сек)
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "300"))
+# Через сколько без изменений состояние считается брошенным и удаляется из БД (сек)
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "604800"))
+
+
+# Запись кэша: состояние, данные, время последнего обращения
+class _Entry:
+    __slots__ = ("state", "data", "touched")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any]):
+        self.state = state
+        self.data = data
+        self.touched = time.monotonic()
+
+
+# FSM-хранилище в PostgreSQL (таблица fsm_storage).
+# cached=True: write-back кэш в памяти процесса - чтение из кэша, запись в кэш с отложенным пакетным
+# сбросом раз в FSM_FLUSH_INTERVAL. Кэш не сверяется с БД, поэтому годится, только если все апдейты
+# одного чата обрабатывает один процесс: polling в одном процессе или launcher.py (шардирование по chat_id).
+# cached=False: каждое чтение и запись идут в БД - для нескольких экземпляров бота за балансировщиком.
+# В обоих режимах пустые состояния удаляются, а брошенные (старше FSM_STATE_TTL) периодически чистятся.
+class PostgresStorage(BaseStorage):
+    def __init__(self, db: Database, cached: bool = True):
+        self.db = db
+        self.cached = cached
+        self._cache = {}
+        self._dirty = set()
+        self._flush_lock = asyncio.Lock()
+        self._tasks = []
+
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        parts = [
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            getattr(key, "thread_id", None) or "",
+            getattr(key, "business_connection_id", None) or "",
+            key.destiny
+        ]
+        return ":".join(map(str, parts))
+
+
+# Запуск фоновой очистки (и сброса кэша - в режиме cached)
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._cleanup_periodically())]
+            if self.cached:
+                self._tasks.append(asyncio.create_task(self._flush_periodically()))
+
+
+    async def _fetch(self, key: str) -> _Entry:
+        with tracing.span("fsm", "load"):
+            row = await self.db.fetchrow_prepared("fsm_get", key)
+        if row:
+            return _Entry(row["state"], json.loads(row["data"]))
+        return _Entry(None, {})
+
+
+    async def _load(self, key: str) -> _Entry:
+        if not self.cached:
+            return await self._fetch(key)
+        entry = self._cache.get(key)
+        if entry is None:
+            entry = await self._fetch(key)
+            # Пока ждали БД, запись могла появиться
+            entry = self._cache.setdefault(key, entry)
+        entry.touched = time.monotonic()
+        return entry
+
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if not self.cached:
+            # Пустое состояние без данных - строка удаляется, как и при сбросе кэша
+            with tracing.span("fsm", "set_state"):
+                if state is None:
+                    await self.db.fetch_prepared("fsm_clear_state", self._key(key))
+                else:
+                    await self.db.fetch_prepared("fsm_set_state", self._key(key), state)
+            return
+        entry = await self._load(self._key(key))
+        entry.state = state
+        self._dirty.add(self._key(key))
+
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = await self._load(self._key(key))
+        return entry.state
+
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if not self.cached:
+            with tracing.span("fsm", "set_data"):
+                if not data:
+                    await self.db.fetch_prepared("fsm_clear_data", self._key(key))
+                else:
+                    await self.db.fetch_prepared("fsm_set_data", self._key(key), json.dumps(data, default=str))
+            return
+        entry = await self._load(self._key(key))
+        entry.data = dict(data)
+        self._dirty.add(self._key(key))
+
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = await self._load(self._key(key))
+        return dict(entry.data)
+
+
+# Сброс изменённых состояний в БД одной пачкой (пустые состояния удаляются)
+    async def flush(self):
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            upsert, delete = [], []
+            for key in dirty:
+                entry = self._cache.get(key)
+                if entry is None:
+                    continue
+                if entry.state is None and not entry.data:
+                    delete.append(key)
+                else:
+                    upsert.append((key, entry.state, json.dumps(entry.data, default=str)))
+            try:
+                if upsert:
+                    await self.db.fetch_prepared(
+                        "fsm_upsert",
+                        [k for k, _, _ in upsert],
+                        [s for _, s, _ in upsert],
+                        [d for _, _, d in upsert]
+                    )
+                if delete:
+                    await self.db.fetch_prepared("fsm_delete", delete)
+            except Exception as e:
+                logger.error("Ошибка сброса FSM-состояний в БД (%d шт.): %s", len(dirty), e)
+                self._dirty |= dirty
+
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(FSM_FLUSH_INTERVAL)
+            await self.flush()
+
+
+# Выгрузка давно не используемых записей из памяти и удаление брошенных состояний из БД
+    async def _cleanup_periodically(self):
+        while True:
+            await asyncio.sleep(max(FSM_CACHE_TTL / 2, 1))
+            deadline = time.monotonic() - FSM_CACHE_TTL
+            for key in [k for k, e in self._cache.items() if e.touched < deadline and k not in self._dirty]:
+                del self._cache[key]
+            try:
+                await self.db.fetch_prepared("fsm_purge", FSM_STATE_TTL)
+            except Exception as e:
+                logger.error("Ошибка очистки устаревших FSM-состояний: %s", e)
+
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
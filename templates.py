@@ -0,0 +1,143 @@
+import html
+import logging
+import os
+import string
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Часовой пояс пользователей, которые его не выбрали (/timezone). Дедлайны в БД хранятся в UTC,
+# поэтому UTC по умолчанию сохраняет смысл дедлайнов, введённых до появления часовых поясов.
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
+# Язык сообщений, если язык пользователя неизвестен или для него нет шаблонов
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "ru")
+
+_formatter = string.Formatter()
+
+
+# Шаблон сообщения: поля именованные ({title}, {deadline:%d.%m.%Y %H:%M}) и проверяются при загрузке,
+# отрисовка - str.format исходной строки (лишние аргументы render игнорируются).
+class Template:
+    __slots__ = ("source", "fields", "render")
+
+    def __init__(self, source: str):
+        fields = []
+        for _, field, _, _ in _formatter.parse(source):
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(f"Неподдерживаемое поле шаблона {{{field}}}: {source!r}")
+            if field not in fields:
+                fields.append(field)
+        self.source = source
+        self.fields = tuple(fields)
+        self.render = source.format
+
+
+    def __repr__(self) -> str:
+        return f"Template({self.source!r})"
+
+
+# Шаблоны по языкам; у каждого языка должны быть все ключи языка по умолчанию
+_SOURCES = {
+    "ru": {
+        "reminder": "⚠️ Проект «{title}»: дедлайн через {hours} ч. ({deadline:%d.%m.%Y %H:%M})",
+        "digest_header": "⚠️ Приближаются дедлайны ({count}):",
+        "digest_item": "№{id} «{title}»: через {hours} ч. ({deadline:%d.%m %H:%M})"
+    },
+    "en": {
+        "reminder": "⚠️ Project «{title}»: deadline in {hours} h ({deadline:%Y-%m-%d %H:%M})",
+        "digest_header": "⚠️ Upcoming deadlines ({count}):",
+        "digest_item": "#{id} «{title}»: in {hours} h ({deadline:%m-%d %H:%M})"
+    }
+}
+
+TEMPLATES = {
+    language: {key: Template(source) for key, source in sources.items()}
+    for language, sources in _SOURCES.items()
+}
+
+
+# Шаблоны по language_code Telegram ("ru", "en-US", None)
+def templates_for(language_code: str | None) -> dict[str, Template]:
+    if language_code:
+        found = TEMPLATES.get(language_code[:2].lower())
+        if found:
+            return found
+    return TEMPLATES[DEFAULT_LANGUAGE]
+
+
+# Часовой пояс по имени IANA (None или неизвестное имя - пояс по умолчанию)
+def user_zone(name: str | None) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Неизвестный часовой пояс %r, используется %s", name, DEFAULT_TIMEZONE)
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+# Проверка имени часового пояса, которое ввёл пользователь
+def is_valid_zone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+# Время из БД (UTC без пояса) -> местное время пользователя
+def to_local(value: datetime, zone: ZoneInfo) -> datetime:
+    return value.replace(tzinfo=timezone.utc).astimezone(zone)
+
+
+# Местное время, введённое пользователем -> UTC без пояса (для записи в БД)
+def to_utc(value: datetime, zone: ZoneInfo) -> datetime:
+    return value.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# Сколько целых часов до дедлайна: округление до ближайшего часа, чтобы напоминание "за 24 ч",
+# отправленное на секунды позже, не превращалось в "23 ч"
+def hours_left(deadline: datetime, now: datetime) -> int:
+    return max(1, round((deadline - now).total_seconds() / 3600))
+
+
+# Тексты напоминаний для пачки проектов от одного момента now (UTC без пояса).
+# В строках нужны title, deadline, timezone и language_code получателя; пояс и шаблон
+# выбираются один раз на каждую пару (timezone, language_code) в пачке.
+# Бот отправляет сообщения с parse_mode=HTML, поэтому название проекта экранируется.
+def render_reminders(projects, now: datetime) -> list[str]:
+    locales = {}
+    texts = []
+    for p in projects:
+        key = (p["timezone"], p["language_code"])
+        locale = locales.get(key)
+        if locale is None:
+            locale = locales[key] = (user_zone(key[0]), templates_for(key[1])["reminder"].render)
+        zone, render = locale
+        texts.append(render(
+            title=html.escape(p["title"]),
+            hours=hours_left(p["deadline"], now),
+            deadline=to_local(p["deadline"], zone)
+        ))
+    return texts
+
+
+# Сводка для одного получателя: несколько напоминаний одним сообщением (строки - как в render_reminders)
+def render_digest(projects, now: datetime) -> str:
+    first = projects[0]
+    zone = user_zone(first["timezone"])
+    templates = templates_for(first["language_code"])
+    item = templates["digest_item"].render
+    lines = [templates["digest_header"].render(count=len(projects))]
+    for p in projects:
+        lines.append(item(
+            id=p["id"],
+            title=html.escape(p["title"]),
+            hours=hours_left(p["deadline"], now),
+            deadline=to_local(p["deadline"], zone)
+        ))
+    return "\n".join(lines)
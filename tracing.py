@@ -0,0 +1,125 @@
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Трассировка апдейтов (по умолчанию выключена)
+TRACING = os.getenv("TRACING", "0") == "1"
+# Апдейты дольше порога (сек) логируются с разбивкой по span'ам
+TRACE_SLOW_THRESHOLD = float(os.getenv("TRACE_SLOW_THRESHOLD", "1"))
+# Доля апдейтов, которые профилируются cProfile (профиль сохраняется, только если апдейт медленный)
+TRACE_PROFILE_RATE = float(os.getenv("TRACE_PROFILE_RATE", "0"))
+TRACE_PROFILE_DIR = os.getenv("TRACE_PROFILE_DIR", "profiles")
+
+
+# Трасса одного апдейта: список span'ов (вид, имя, длительность)
+class Trace:
+    __slots__ = ("update_id", "start", "spans")
+
+    def __init__(self, update_id: int):
+        self.update_id = update_id
+        self.start = time.perf_counter()
+        self.spans = []
+
+
+    def duration(self) -> float:
+        return time.perf_counter() - self.start
+
+
+# Сводка: одинаковые span'ы складываются, самые долгие - первыми
+    def breakdown(self) -> str:
+        totals = {}
+        for kind, name, duration in self.spans:
+            count, total = totals.get((kind, name), (0, 0.0))
+            totals[(kind, name)] = (count + 1, total + duration)
+        items = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return "; ".join(
+            f"{kind} {name}{f' x{count}' if count > 1 else ''} {total * 1000:.1f} мс"
+            for (kind, name), (count, total) in items
+        )
+
+
+_current: ContextVar[Trace | None] = ContextVar("trace", default=None)
+
+
+# Текущая трасса (None, если трассировка выключена или код работает вне апдейта)
+def current() -> Trace | None:
+    return _current.get()
+
+
+# Сделать трассу текущей на время блока (без логирования медленных апдейтов)
+@contextmanager
+def start(update_id: int | None = None):
+    trace = Trace(update_id)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+# Замер участка внутри апдейта; trace - явная трасса для кода, работающего в другой задаче (пул отправки)
+@contextmanager
+def span(kind: str, name: str, trace: Trace | None = None):
+    trace = trace or _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((kind, name, time.perf_counter() - start))
+
+
+# Записать уже измеренный участок
+def record(kind: str, name: str, duration: float, trace: Trace | None = None):
+    trace = trace or _current.get()
+    if trace is not None:
+        trace.spans.append((kind, name, duration))
+
+
+# cProfile профилирует весь поток, а не одну задачу: в профиль попадают и параллельные апдейты.
+# Одновременно активен только один профилировщик.
+_profiling = False
+
+
+# Выполнить обработку апдейта в трассе; медленные апдейты логируются, выбранные - профилируются
+async def trace_update(update_id: int, handler):
+    global _profiling
+    profiler = None
+    if TRACE_PROFILE_RATE and not _profiling and random.random() < TRACE_PROFILE_RATE:
+        _profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with start(update_id) as trace:
+            return await handler()
+    finally:
+        if profiler:
+            profiler.disable()
+            _profiling = False
+        duration = trace.duration()
+        if duration >= TRACE_SLOW_THRESHOLD:
+            logger.warning("Медленный апдейт %s: %.1f мс (%s)", update_id, duration * 1000, trace.breakdown())
+            if profiler:
+                await _dump_profile(profiler, update_id)
+
+
+async def _dump_profile(profiler: cProfile.Profile, update_id: int):
+    path = os.path.join(TRACE_PROFILE_DIR, f"update_{update_id}_{int(time.time())}.prof")
+    try:
+        os.makedirs(TRACE_PROFILE_DIR, exist_ok=True)
+        await asyncio.to_thread(profiler.dump_stats, path)
+        logger.warning("Профиль апдейта %s сохранён в %s", update_id, path)
+    except Exception as e:
+        logger.error("Не удалось сохранить профиль апдейта %s: %s", update_id, e)
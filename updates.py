@@ -0,0 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+# id чата апдейта из сырого JSON Telegram (None, если у апдейта нет чата/пользователя)
+def chat_id_of(update: dict) -> int | None:
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post", "business_message"):
+        event = update.get(field)
+        if event:
+            return event["chat"]["id"]
+    callback = update.get("callback_query")
+    if callback:
+        message = callback.get("message")
+        if message:
+            return message["chat"]["id"]
+        return callback["from"]["id"]
+    for field in ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query", "my_chat_member", "chat_member", "chat_join_request"):
+        event = update.get(field)
+        if event:
+            chat = event.get("chat")
+            return chat["id"] if chat else event["from"]["id"]
+    return None
+
+
+# Последовательная обработка апдейтов одного чата при параллельной обработке разных чатов
+# (FSM-сценарии вроде AddMember/SetDeadline не должны обгонять сами себя).
+# Слот параллельности (max_concurrency) занимается уже после блокировки чата: апдейты, ждущие
+# свой чат, слотов не держат, и один чат с сотней быстрых апдейтов не останавливает остальные.
+class ChatSerializer:
+    def __init__(self, max_concurrency: int | None = None):
+        self._locks = {}
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+
+    @asynccontextmanager
+    async def hold(self, chat_id: int | None):
+        if chat_id is None:
+            async with self._slot():
+                yield
+            return
+        entry = self._locks.get(chat_id)
+        if entry is None:
+            entry = self._locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slot():
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[chat_id]
+
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self._slots is None:
+            yield
+            return
+        async with self._slots:
+            yield
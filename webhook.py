@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from dotenv import load_dotenv
+from updates import ChatSerializer, chat_id_of
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Публичный адрес, на который Telegram шлёт апдейты (без пути); если не задан - setWebhook не вызывается
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Сколько апдейтов обрабатывается одновременно (разных чатов)
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "100"))
+# Сколько принятых апдейтов может ждать обработки; при заполнении ответ Telegram задерживается
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", str(WEBHOOK_MAX_CONCURRENCY * 10)))
+
+
+# Приём апдейтов по вебхуку (aiohttp) с ограниченной параллельностью
+class WebhookServer:
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        host: str = WEBHOOK_HOST,
+        port: int = WEBHOOK_PORT,
+        path: str = WEBHOOK_PATH,
+        secret: str | None = WEBHOOK_SECRET,
+        max_concurrency: int = WEBHOOK_MAX_CONCURRENCY,
+        max_pending: int = WEBHOOK_MAX_PENDING
+    ):
+        self.dp = dp
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self._pending = asyncio.Semaphore(max_pending)
+        self._chats = ChatSerializer(max_concurrency)
+        self._tasks = set()
+        self._runner = None
+
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+
+# Обработчик запроса Telegram: проверка секрета, постановка апдейта в обработку, быстрый ответ 200
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret:
+            logger.warning("Вебхук: запрос с неверным секретом от %s", request.remote)
+            return web.Response(status=401)
+        try:
+            data = await request.json()
+            await self.accept(data)
+        except Exception as e:
+            logger.error("Вебхук: не удалось разобрать апдейт: %s", e)
+            return web.Response(status=400)
+        return web.Response()
+
+
+# Принять сырой апдейт: разбор в модель aiogram и обработка в этом процессе
+# (launcher.py переопределяет приём и раскладывает апдейты по воркерам)
+    async def accept(self, data: dict):
+        update = Update.model_validate(data, context={"bot": self.bot})
+        await self._pending.acquire()
+        task = asyncio.create_task(self._process(update, chat_id_of(data)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+    async def _process(self, update: Update, chat_id: int | None):
+        try:
+            async with self._chats.hold(chat_id):
+                await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            logger.error("Ошибка обработки апдейта %s: %s", update.update_id, e)
+        finally:
+            self._pending.release()
+
+
+# Запуск HTTP-сервера и регистрация вебхука (накопившиеся апдейты не сбрасываются)
+    async def start(self):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Вебхук слушает %s:%d%s", self.host, self.port, self.path)
+        if WEBHOOK_URL:
+            await self.bot.set_webhook(
+                WEBHOOK_URL.rstrip("/") + self.path,
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types(),
+                drop_pending_updates=False
+            )
+            logger.info("Вебхук зарегистрирован в Telegram")
+
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# Работа в режиме вебхука до остановки процесса
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    server = WebhookServer(dp, bot)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()